@@ -12,12 +12,19 @@ Protocol Discovery:
 This version tries both binary and ASCII hex encoding.
 """
 
-import serial
-import serial.tools.list_ports
+import argparse
 import time
 import struct
 from datetime import datetime
 
+from rendering import (
+    VERBOSE,
+    add_output_arguments,
+    configure_from_args,
+    get_renderer,
+)
+from transports import list_serial_ports, open_transport
+
 class AlcoholTester:
     # Protocol constants - trying both interpretations
     HEADER_BINARY = bytes([0xFA, 0xF5])
@@ -33,26 +40,22 @@ class AlcoholTester:
         self.serial = None
         self.responses = []
         
-    def connect(self, port=None, baudrate=None):
+    def connect(self, port=None, baudrate=None, transport=None):
+        if transport is not None:
+            self.serial = transport
+            return True
         if port:
             self.port = port
         if baudrate:
             self.baudrate = baudrate
             
         try:
-            self.serial = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=2,
-                rtscts=False,
-                dsrdtr=False
-            )
+            # rtscts/dsrdtr only apply to local serial ports
+            self.serial = open_transport(self.port, self.baudrate, timeout=2,
+                                         rtscts=False, dsrdtr=False)
             # Try different flow control settings
-            self.serial.setRTS(True)
-            self.serial.setDTR(True)
+            self.serial.rts = True
+            self.serial.dtr = True
             time.sleep(0.5)  # Give device time to initialize
             print(f"Connected to {self.port} at {self.baudrate} baud")
             return True
@@ -96,26 +99,31 @@ class AlcoholTester:
             return None
     
     def print_response(self, data, response, description=""):
-        """Pretty print sent/received data"""
-        print(f"  [{description}]" if description else "")
-        print(f"    Sent ({len(data)} bytes): {data.hex()} | {repr(data)}")
+        """Pretty print sent/received data (queued on the shared renderer)"""
+        out = get_renderer()
+        out.event('exchange', description=description, sent=data,
+                  received=response or b"")
+        out.line(f"  [{description}]" if description else "")
+        out.line(lambda: f"    Sent ({len(data)} bytes): {data.hex()}")
+        out.line(lambda: f"    Sent repr: {repr(data)}", VERBOSE)
         if response:
-            print(f"    Recv ({len(response)} bytes): {response.hex()}")
-            print(f"    ASCII: {repr(response)}")
+            out.line(lambda: f"    Recv ({len(response)} bytes): {response.hex()}")
+            out.line(lambda: f"    ASCII: {repr(response)}", VERBOSE)
             # Try to parse as ASCII hex
-            try:
-                if all(c in b'0123456789ABCDEFabcdef' for c in response):
-                    decoded = bytes.fromhex(response.decode('ascii'))
-                    print(f"    Decoded hex: {decoded.hex()}")
-            except:
-                pass
+            if out.enabled(VERBOSE):
+                try:
+                    if all(c in b'0123456789ABCDEFabcdef' for c in response):
+                        decoded = bytes.fromhex(response.decode('ascii'))
+                        out.line(f"    Decoded hex: {decoded.hex()}", VERBOSE)
+                except ValueError:
+                    pass
         else:
-            print("    No response")
-        print()
+            out.line("    No response")
+        out.line("")
         
     def try_ascii_hex_commands(self):
         """Try commands using ASCII hex encoding (like 'FAF5' instead of 0xFAF5)"""
-        print("\n=== Trying ASCII Hex Encoded Commands ===\n")
+        get_renderer().line("\n=== Trying ASCII Hex Encoded Commands ===\n")
         
         # ASCII hex encoded commands
         commands = [
@@ -148,10 +156,11 @@ class AlcoholTester:
         for cmd, desc in commands:
             response = self.send_and_receive(cmd, desc)
             self.print_response(cmd, response, desc)
+        get_renderer().flush()
             
     def try_binary_commands(self):
         """Try commands using binary encoding"""
-        print("\n=== Trying Binary Commands ===\n")
+        get_renderer().line("\n=== Trying Binary Commands ===\n")
         
         # Binary commands
         commands = [
@@ -191,10 +200,11 @@ class AlcoholTester:
         for cmd, desc in commands:
             response = self.send_and_receive(cmd, desc)
             self.print_response(cmd, response, desc)
+        get_renderer().flush()
     
     def try_wake_sequences(self):
         """Try various wake-up sequences"""
-        print("\n=== Trying Wake Sequences ===\n")
+        get_renderer().line("\n=== Trying Wake Sequences ===\n")
         
         wake_sequences = [
             # Empty/null bytes
@@ -223,12 +233,14 @@ class AlcoholTester:
         for cmd, desc in wake_sequences:
             response = self.send_and_receive(cmd, desc, wait_time=1)
             self.print_response(cmd, response, desc)
+        get_renderer().flush()
     
     def continuous_read(self, duration=30):
         """Continuously read from port for specified duration"""
-        print(f"\n=== Continuous Read Mode ({duration}s) ===")
-        print("Please interact with the device (press buttons, etc.)")
-        print("-" * 50)
+        out = get_renderer()
+        out.line(f"\n=== Continuous Read Mode ({duration}s) ===")
+        out.line("Please interact with the device (press buttons, etc.)")
+        out.line("-" * 50)
         
         start_time = time.time()
         
@@ -236,8 +248,11 @@ class AlcoholTester:
             if self.serial and self.serial.in_waiting > 0:
                 data = self.serial.read(self.serial.in_waiting)
                 timestamp = time.strftime("%H:%M:%S")
-                print(f"[{timestamp}] Received: {data.hex()} | {repr(data)}")
+                out.event('rx', data=data)
+                out.line(lambda: f"[{timestamp}] Received: {data.hex()}")
+                out.line(lambda: f"[{timestamp}] Raw: {repr(data)}", VERBOSE)
             time.sleep(0.1)
+        out.flush()
             
     def scan_all_baudrates(self):
         """Scan through all baud rates"""
@@ -267,7 +282,7 @@ class AlcoholTester:
 
 def list_ports():
     """List available serial ports"""
-    ports = serial.tools.list_ports.comports()
+    ports = list_serial_ports()
     print("Available serial ports:")
     for p in ports:
         print(f"  {p.device}: {p.description} [{p.hwid}]")
@@ -334,4 +349,7 @@ def main():
         print("\nTry running serial_monitor.py and interacting with the device")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Try command encodings")
+    add_output_arguments(parser)
+    configure_from_args(parser.parse_args())
     main()
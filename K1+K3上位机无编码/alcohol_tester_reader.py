@@ -11,12 +11,22 @@ Protocol Analysis:
 Based on Qt5SerialPort communication patterns observed in the binary.
 """
 
-import serial
-import serial.tools.list_ports
+import argparse
 import time
 import struct
 from datetime import datetime
 
+from profiling import add_profile_argument, run_maybe_profiled
+from protocol import FrameError, parse_frame
+from rendering import (
+    DEBUG,
+    VERBOSE,
+    add_output_arguments,
+    configure_from_args,
+    get_renderer,
+)
+from transports import list_serial_ports, open_transport
+
 # Protocol constants discovered from binary analysis
 HEADER = bytes([0xFA, 0xF5])
 CMD_PREFIX = 0xA5
@@ -33,14 +43,17 @@ class AlcoholTesterReader:
         
     def find_device(self):
         """Find available serial ports"""
-        ports = serial.tools.list_ports.comports()
+        ports = list_serial_ports()
         print("Available serial ports:")
         for p in ports:
             print(f"  - {p.device}: {p.description}")
         return ports
     
-    def connect(self, port=None, baudrate=None):
-        """Connect to the alcohol tester"""
+    def connect(self, port=None, baudrate=None, transport=None):
+        """Connect to the alcohol tester (port may be a COM port or tcp:// URL)"""
+        if transport is not None:
+            self.serial = transport
+            return True
         if port:
             self.port = port
         if baudrate:
@@ -51,14 +64,7 @@ class AlcoholTesterReader:
             return False
             
         try:
-            self.serial = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=2
-            )
+            self.serial = open_transport(self.port, self.baudrate, timeout=2)
             print(f"Connected to {self.port} at {self.baudrate} baud")
             return True
         except Exception as e:
@@ -143,7 +149,8 @@ class AlcoholTesterReader:
     
     def probe_commands(self):
         """Probe various commands to find working ones"""
-        print("\n=== Probing for working commands ===\n")
+        out = get_renderer()
+        out.line("\n=== Probing for working commands ===\n")
         
         # Command codes to try based on typical device commands
         command_codes = {
@@ -172,7 +179,7 @@ class AlcoholTesterReader:
         working_commands = []
         
         for cmd_code, cmd_name in command_codes.items():
-            print(f"Testing command 0x{cmd_code:02X} ({cmd_name})...")
+            out.line(f"Testing command 0x{cmd_code:02X} ({cmd_name})...")
             
             commands = self.build_command(cmd_code)
             
@@ -180,9 +187,11 @@ class AlcoholTesterReader:
                 response = self.send_raw(cmd_bytes)
                 
                 if response and len(response) > 0:
-                    print(f"  [{format_name}] Sent: {cmd_bytes.hex()}")
-                    print(f"  [{format_name}] Received: {response.hex()}")
-                    print(f"  [{format_name}] ASCII: {response}")
+                    out.line(lambda: f"  [{format_name}] Sent: {cmd_bytes.hex()}")
+                    out.line(lambda: f"  [{format_name}] Received: {response.hex()}")
+                    out.line(lambda: f"  [{format_name}] ASCII: {response}", VERBOSE)
+                    out.event('probe', code=cmd_code, format=format_name,
+                              request=cmd_bytes, response=response)
                     working_commands.append({
                         'code': cmd_code,
                         'name': cmd_name,
@@ -190,15 +199,17 @@ class AlcoholTesterReader:
                         'request': cmd_bytes,
                         'response': response
                     })
-                    print()
+                    out.line("")
                     
                 time.sleep(0.1)
         
+        out.flush()
         return working_commands
     
     def try_connection_sequence(self):
         """Try common connection sequences"""
-        print("\n=== Trying connection sequences ===\n")
+        out = get_renderer()
+        out.line("\n=== Trying connection sequences ===\n")
         
         sequences = [
             # Based on FAF5 and A50D0A patterns
@@ -227,21 +238,20 @@ class AlcoholTesterReader:
         
         for name, seq in sequences:
             response = self.send_raw(seq)
-            print(f"Sent [{name}]: {seq.hex()}")
+            out.line(lambda: f"Sent [{name}]: {seq.hex()}")
+            out.event('sequence', name=name, request=seq, response=response or b"")
             if response:
-                print(f"  Response: {response.hex()}")
-                try:
-                    print(f"  ASCII: {response.decode('utf-8', errors='replace')}")
-                except:
-                    pass
+                out.data("Response", response, views=('hex', 'ascii'))
             else:
-                print("  No response")
-            print()
+                out.line("  No response")
+            out.line("")
             time.sleep(0.2)
+        out.flush()
     
     def read_records(self):
         """Try to read alcohol test records"""
-        print("\n=== Attempting to read records ===\n")
+        out = get_renderer()
+        out.line("\n=== Attempting to read records ===\n")
         
         # Try various record reading commands
         record_commands = [
@@ -262,49 +272,57 @@ class AlcoholTesterReader:
         
         for cmd in record_commands:
             response = self.send_raw(cmd)
-            print(f"Command: {cmd.hex()}")
+            out.line(lambda: f"Command: {cmd.hex()}")
+            out.event('read', request=cmd, response=response or b"")
             if response:
-                print(f"  Response ({len(response)} bytes): {response.hex()}")
+                out.line(lambda: f"  Response ({len(response)} bytes): {response.hex()}")
                 self.parse_response(response)
             else:
-                print("  No response")
-            print()
+                out.line("  No response")
+            out.line("")
             time.sleep(0.2)
+        out.flush()
     
     def parse_response(self, data):
         """Try to parse response data"""
         if not data:
             return
         
-        print(f"  Raw bytes: {' '.join(f'{b:02X}' for b in data)}")
+        out = get_renderer()
+        out.line(lambda: f"  Raw bytes: {' '.join(f'{b:02X}' for b in data)}", VERBOSE)
         
         # Try to decode as ASCII
-        try:
+        if out.enabled(VERBOSE):
             ascii_str = data.decode('utf-8', errors='replace')
             if ascii_str.isprintable() or '\r' in ascii_str or '\n' in ascii_str:
-                print(f"  ASCII: {repr(ascii_str)}")
-        except:
-            pass
+                out.line(f"  ASCII: {repr(ascii_str)}", VERBOSE)
         
         # Check for common response headers
         if len(data) >= 2:
             if data[0] == 0xFA and data[1] == 0xF5:
-                print("  Header: FA F5 detected")
+                out.line("  Header: FA F5 detected")
+                try:
+                    if parse_frame(data) is None:
+                        out.line("  Frame: incomplete (partial read?)")
+                    else:
+                        out.line("  Frame: checksum OK")
+                except FrameError as e:
+                    out.line(f"  Frame: {e}")
                 if len(data) > 2:
-                    print(f"  Command response: 0x{data[2]:02X}")
+                    out.line(f"  Command response: 0x{data[2]:02X}")
                     if len(data) > 3:
-                        print(f"  Data: {data[3:].hex()}")
+                        out.line(lambda: f"  Data: {data[3:].hex()}")
         
         # Try to find alcohol concentration values
         # Often stored as 16-bit integers (mg/L or mg/100mL)
-        if len(data) >= 4:
+        if len(data) >= 4 and out.enabled(DEBUG):
             for i in range(len(data) - 1):
                 val_le = struct.unpack('<H', data[i:i+2])[0]
                 val_be = struct.unpack('>H', data[i:i+2])[0]
                 if 0 < val_le < 5000:  # Reasonable range for alcohol readings
-                    print(f"  Possible value at offset {i} (LE): {val_le}")
+                    out.line(f"  Possible value at offset {i} (LE): {val_le}", DEBUG)
                 if 0 < val_be < 5000:
-                    print(f"  Possible value at offset {i} (BE): {val_be}")
+                    out.line(f"  Possible value at offset {i} (BE): {val_be}", DEBUG)
 
     def auto_detect_baudrate(self):
         """Try to auto-detect the correct baud rate"""
@@ -383,4 +401,9 @@ def main():
     print("=" * 60)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Probe the alcohol tester")
+    add_profile_argument(parser)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    run_maybe_profiled(args, main, name="probe")
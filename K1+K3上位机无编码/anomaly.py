@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Streaming anomaly detection for downloaded records
+
+Checks run per device as records arrive, each in O(1) per record:
+
+- repeated_value: the same non-zero concentration many times in a row
+  (a replayed or stuck reading)
+- burst: too many tests inside a short window (someone blowing until
+  they pass)
+- clock_backwards / clock_jump: the record number moved forward but the
+  timestamp went back, or leapt further than the device is ever idle
+- stuck_zero: an unusually long run of exact zeros (dead sensor)
+
+process() takes a batch of records and returns the flags it raised, so
+it can run inline in the download loop or on whole imports.
+"""
+
+import argparse
+from collections import Counter, deque, namedtuple
+from datetime import datetime, timedelta
+from itertools import groupby, islice
+
+from protocol import Record
+from record_store import RecordStore
+
+# Records handed to process() at a time when scanning a store
+BATCH_SIZE = 1000
+
+Flag = namedtuple('Flag', ['device', 'record', 'kind', 'detail'])
+
+
+class DeviceState:
+    __slots__ = ('last', 'repeat_run', 'zero_run', 'recent')
+
+    def __init__(self, burst_count):
+        self.last = None
+        self.repeat_run = 0
+        self.zero_run = 0
+        # Timestamps of the last burst_count tests
+        self.recent = deque(maxlen=burst_count)
+
+
+class AnomalyDetector:
+    def __init__(self, repeat_threshold=5, burst_count=5,
+                 burst_window=timedelta(seconds=60),
+                 max_gap=timedelta(days=30), zero_run_threshold=300):
+        self.repeat_threshold = repeat_threshold
+        self.burst_count = burst_count
+        self.burst_window = burst_window
+        self.max_gap = max_gap
+        self.zero_run_threshold = zero_run_threshold
+        self.devices = {}
+        self.counts = Counter()
+
+    def process(self, device_id, records):
+        """Feed a batch of one device's records (in record order), return flags"""
+        state = self.devices.get(device_id)
+        if state is None:
+            state = self.devices[device_id] = DeviceState(self.burst_count)
+
+        # Locals: this loop runs for every record of every download
+        flags = []
+        last = state.last
+        repeat_run = state.repeat_run
+        zero_run = state.zero_run
+        recent = state.recent
+        repeat_threshold = self.repeat_threshold
+        burst_count = self.burst_count
+        burst_window = self.burst_window
+        max_gap = self.max_gap
+        zero_run_threshold = self.zero_run_threshold
+        no_gap = timedelta(0)
+
+        for record in records:
+            value = record.concentration
+            when = record.timestamp
+
+            if last is not None:
+                if value != 0 and value == last.concentration:
+                    repeat_run += 1
+                    if repeat_run == repeat_threshold:
+                        flags.append(Flag(device_id, record, 'repeated_value',
+                                          f"{value:.3f} mg/L {repeat_run} times in a row"))
+                else:
+                    repeat_run = 1
+
+                if record.number > last.number:
+                    gap = when - last.timestamp
+                    if gap < no_gap:
+                        flags.append(Flag(device_id, record, 'clock_backwards',
+                                          f"{-gap} earlier than record #{last.number}"))
+                        # Times before the jump say nothing about a burst now
+                        recent.clear()
+                    elif gap > max_gap and record.number - last.number == 1:
+                        flags.append(Flag(device_id, record, 'clock_jump',
+                                          f"{gap} after record #{last.number}"))
+            else:
+                repeat_run = 1
+
+            if value == 0:
+                zero_run += 1
+                if zero_run == zero_run_threshold:
+                    flags.append(Flag(device_id, record, 'stuck_zero',
+                                      f"{zero_run} zero readings in a row"))
+            else:
+                zero_run = 0
+
+            # Bounded deque: the oldest of the last burst_count tests falls
+            # out by itself, so this stays O(1) whatever the clock does
+            recent.append(when)
+            if len(recent) == burst_count and no_gap <= when - recent[0] <= burst_window:
+                flags.append(Flag(device_id, record, 'burst',
+                                  f"{burst_count} tests within {burst_window}"))
+                # One flag per burst: the next needs burst_count new tests
+                recent.clear()
+
+            last = record
+
+        state.last = last
+        state.repeat_run = repeat_run
+        state.zero_run = zero_run
+        for flag in flags:
+            self.counts[flag.kind] += 1
+        return flags
+
+    def print_summary(self):
+        print("Anomaly flags:")
+        if not self.counts:
+            print("  none")
+        for kind, count in self.counts.most_common():
+            print(f"  {kind}: {count}")
+
+
+def format_flag(flag):
+    r = flag.record
+    return (f"!! {flag.kind} on {flag.device} #{r.number} "
+            f"{r.timestamp:%Y-%m-%d %H:%M:%S}: {flag.detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan stored records for anomalies")
+    parser.add_argument("store", help="SQLite record store")
+    parser.add_argument("--device")
+    args = parser.parse_args()
+
+    store = RecordStore(args.store)
+    detector = AnomalyDetector()
+    rows = store.iter_records(args.device, limit=-1, batch_size=BATCH_SIZE)
+    for device_id, group in groupby(rows, key=lambda row: row['device_id']):
+        records = (Record(row['number'], datetime.fromisoformat(row['timestamp']),
+                          row['concentration']) for row in group)
+        while True:
+            batch = list(islice(records, BATCH_SIZE))
+            if not batch:
+                break
+            for flag in detector.process(device_id, batch):
+                print(format_flag(flag))
+    detector.print_summary()
+
+
+if __name__ == "__main__":
+    main()
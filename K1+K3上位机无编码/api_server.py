@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Local HTTP API for imported records
+
+Serves the RecordStore over plain HTTP/1.1 with asyncio, no framework:
+
+    GET /devices
+    GET /records?device=&since=&until=&cursor=&limit=
+    GET /aggregates?device=&since=&until=
+
+Polling dashboards should cost almost nothing:
+
+- every response carries an ETag derived from the store generation and
+  the query, so If-None-Match is answered with 304 before touching the
+  database
+- rendered bodies sit in an LRU cache that is dropped as soon as the
+  store generation changes (i.e. a new import landed)
+- /records is streamed with chunked encoding in pages; the response
+  ends with next_cursor for the following page
+
+"bench" starts the server on a temporary store and load-tests it locally.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+from protocol import Record
+from record_store import RecordStore, normalize_time
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Rows fetched per database call and sent per chunk
+STREAM_BATCH = 200
+# Bodies larger than this are streamed but not cached
+MAX_CACHED_BODY = 256 * 1024
+# How long a store generation read is trusted before asking SQLite again
+GENERATION_TTL = 0.25
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LruCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class ApiServer:
+    def __init__(self, store, host="127.0.0.1", port=8080, cache_entries=256):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.cache = LruCache(cache_entries)
+        # SQLite calls run on one worker thread, off the event loop
+        self.db = ThreadPoolExecutor(max_workers=1)
+        self.generation = None
+        self.generation_checked = 0.0
+        self.server = None
+        self.stats = {'requests': 0, 'not_modified': 0, 'streamed': 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.db.shutdown()
+
+    async def run_db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.db, func, *args)
+
+    async def current_generation(self):
+        """Store generation; clears the cache when a new import is seen"""
+        now = time.monotonic()
+        if self.generation is None or now - self.generation_checked > GENERATION_TTL:
+            generation = await self.run_db(self.store.generation)
+            self.generation_checked = now
+            if generation != self.generation:
+                self.generation = generation
+                self.cache.clear()
+        return self.generation
+
+    async def handle(self, reader, writer):
+        """Serve requests on one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self.send(writer, 400, {'error': "Bad request line"})
+                    break
+                method, target, version = parts
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+
+                self.stats['requests'] += 1
+                try:
+                    if method != "GET":
+                        raise HttpError(405, f"{method} not allowed")
+                    await self.route(writer, target, headers)
+                except HttpError as e:
+                    await self.send(writer, e.status, {'error': str(e)})
+                except ValueError as e:
+                    await self.send(writer, 400, {'error': str(e)})
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, target, headers):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path not in ("/devices", "/records", "/aggregates"):
+            raise HttpError(404, f"No route for {url.path}")
+        # Normalised up front: a bad value is a 400 before any streaming
+        # starts, and equivalent spellings share one ETag
+        for name in ("since", "until"):
+            if name in query:
+                query[name] = normalize_time(query[name])
+
+        generation = await self.current_generation()
+        canonical = url.path + "?" + "&".join(f"{k}={query[k]}" for k in sorted(query))
+        etag = f'"{generation}-{hashlib.sha1(canonical.encode()).hexdigest()[:16]}"'
+        # Generation in the key: a body rendered during an import never
+        # outlives it, even if it is stored after the cache was cleared
+        key = (generation, canonical)
+
+        if headers.get("if-none-match") == etag:
+            self.stats['not_modified'] += 1
+            await self.send_head(writer, 304, etag)
+            return
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            await self.send_head(writer, 200, etag, len(cached))
+            writer.write(cached)
+            await writer.drain()
+            return
+
+        if url.path == "/devices":
+            body = await self.run_db(self.store.devices)
+            await self.send_cached(writer, key, etag, {'devices': body})
+        elif url.path == "/aggregates":
+            body = await self.run_db(self.store.aggregates, query.get("device"),
+                                     query.get("since"), query.get("until"))
+            await self.send_cached(writer, key, etag, {'aggregates': body})
+        else:
+            await self.stream_records(writer, key, etag, query)
+
+    async def stream_records(self, writer, key, etag, query):
+        limit = int(query.get("limit", DEFAULT_PAGE_SIZE))
+        if limit < 1:
+            raise HttpError(400, f"limit must be at least 1, got {limit}")
+        limit = min(limit, MAX_PAGE_SIZE)
+        after = None
+        if query.get("cursor"):
+            # device:series:number; device ids (tcp://host:port) may contain ':'
+            device_id, series, number = query["cursor"].rsplit(":", 2)
+            after = (device_id, int(series), int(number))
+
+        rows = self.store.iter_records(query.get("device"), query.get("since"),
+                                       query.get("until"), after, limit)
+        self.stats['streamed'] += 1
+        await self.send_head(writer, 200, etag, chunked=True)
+
+        body = bytearray()
+        last = None
+        count = 0
+        chunk = [b'{"records":[']
+        while True:
+            batch = await self.run_db(list, islice(rows, STREAM_BATCH))
+            if not batch:
+                break
+            for row in batch:
+                chunk.append((b"," if count else b"") + json.dumps(row).encode())
+                count += 1
+            last = batch[-1]
+            body += await self.write_chunk(writer, b"".join(chunk))
+            chunk = []
+
+        next_cursor = (f"{last['device_id']}:{last['series']}:{last['number']}"
+                       if count == limit else None)
+        chunk.append(b'],"next_cursor":' + json.dumps(next_cursor).encode() + b"}")
+        body += await self.write_chunk(writer, b"".join(chunk))
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+        if len(body) <= MAX_CACHED_BODY:
+            self.cache.put(key, bytes(body))
+
+    async def write_chunk(self, writer, data):
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        await writer.drain()
+        return data
+
+    async def send_cached(self, writer, key, etag, payload):
+        body = json.dumps(payload).encode()
+        if len(body) <= MAX_CACHED_BODY:
+            self.cache.put(key, body)
+        await self.send_head(writer, 200, etag, len(body))
+        writer.write(body)
+        await writer.drain()
+
+    async def send_head(self, writer, status, etag=None, length=0, chunked=False):
+        reason = {200: "OK", 304: "Not Modified"}[status]
+        head = [f"HTTP/1.1 {status} {reason}",
+                "Content-Type: application/json",
+                "Cache-Control: no-cache"]
+        if etag:
+            head.append(f"ETag: {etag}")
+        if chunked:
+            head.append("Transfer-Encoding: chunked")
+        elif status != 304:
+            head.append(f"Content-Length: {length}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+    async def send(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        reasons = {400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+        writer.write((f"HTTP/1.1 {status} {reasons.get(status, 'Error')}\r\n"
+                      "Content-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def fetch(reader, writer, path, etag=None):
+    """Minimal keep-alive HTTP client for the load test; returns (status, etag)"""
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+    if etag:
+        request += f"If-None-Match: {etag}\r\n"
+    writer.write((request + "\r\n").encode())
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    return status, headers.get("etag")
+
+
+async def load_test(port, paths, clients=20, requests_per_client=200, conditional=True):
+    """Hammer the server from concurrent keep-alive clients and print latencies"""
+    latencies = []
+    statuses = {}
+
+    async def client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        etags = {}
+        for i in range(requests_per_client):
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            status, etag = await fetch(reader, writer, path,
+                                       etags.get(path) if conditional else None)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if etag:
+                etags[path] = etag
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"  {total} requests in {elapsed:.2f}s = {total / elapsed:.0f} req/s "
+          f"({'conditional' if conditional else 'unconditional'})")
+    print(f"  p50 {latencies[total // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(total * 0.99)] * 1000:.2f} ms, statuses {statuses}")
+
+
+def seed_store(store, devices=5, per_device=2000):
+    """Fill a store with synthetic records for benchmarking"""
+    start = datetime(2026, 1, 1, 6, 0)
+    for d in range(devices):
+        when = start
+        records = []
+        for n in range(1, per_device + 1):
+            when += timedelta(minutes=random.randint(2, 30))
+            value = 0.0 if random.random() < 0.9 else round(random.uniform(0.01, 1.2), 3)
+            records.append(Record(n, when, value))
+        store.import_records(f"K1-{d:03d}", records)
+
+
+async def bench(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = RecordStore(os.path.join(tmp, "bench.db"))
+        seed_store(store, args.devices, args.per_device)
+        server = await ApiServer(store, port=0).start()
+        paths = ["/devices", "/aggregates", "/records?limit=500",
+                 "/records?device=K1-000&limit=100"]
+        print(f"Benchmark server on port {server.port}, "
+              f"{args.devices * args.per_device} records")
+        for conditional in (False, True):
+            await load_test(server.port, paths, args.clients, args.requests, conditional)
+        print(f"  cache hits {server.cache.hits}, misses {server.cache.misses}, "
+              f"server stats {server.stats}")
+        await server.stop()
+        store.close()
+
+
+async def serve(args):
+    store = RecordStore(args.store)
+    server = await ApiServer(store, args.host, args.port).start()
+    print(f"Serving {args.store} on http://{args.host}:{server.port}")
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local API for imported records")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="Serve a record store")
+    p.add_argument("--store", default="records.db")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+
+    p = sub.add_parser("bench", help="Load-test against synthetic data")
+    p.add_argument("--devices", type=int, default=5)
+    p.add_argument("--per-device", type=int, default=2000)
+    p.add_argument("--clients", type=int, default=20)
+    p.add_argument("--requests", type=int, default=200)
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args) if args.command == "serve" else bench(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
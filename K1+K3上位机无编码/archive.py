@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Compressed long-term archive for downloaded records
+
+Layout:
+    MAGIC | chunks | segment | footer | chunks | segment | footer | ...
+
+Each append adds its chunks, one index segment listing only those chunks
+(JSON) and a footer: segment offset (u64), end of the previous footer
+(u64, 0 for the first) and MAGIC. The full index is the chain of
+segments, so an append costs the size of what it adds, not of the whole
+index.
+
+Each chunk holds up to CHUNK_RECORDS records of one device, sorted by
+time, stored column by column and zlib-compressed:
+
+    count | timestamps | record numbers | concentrations
+
+- timestamps are seconds since 2000-01-01, the first absolute and the
+  rest as deltas (a few minutes -> one or two bytes)
+- record numbers are deltas too (almost always 1)
+- concentrations are quantised to the device resolution
+  (1 / CONCENTRATION_SCALE mg/L) and stored as plain integers, so the
+  long runs of zero readings compress to almost nothing
+- all integers are zigzag varints
+
+The index stores each chunk's device, offset, size, count and min/max
+time, so a range read only decompresses chunks that overlap the range.
+
+Appends never touch existing bytes, and a footer is only written after
+its chunks and segment are on disk, so an interrupted append leaves the
+previous state readable. Daily appends leave a small chunk per device
+per day; compact() rewrites the file with those merged into full chunks
+and is run by pack once they add up to a full chunk.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from protocol import CONCENTRATION_SCALE, Record
+
+MAGIC = b"ATARCH02"
+# Segment offset, end of the previous footer (0 for the first), MAGIC
+FOOTER = struct.Struct("<QQ8s")
+EPOCH = datetime(2000, 1, 1)
+CHUNK_RECORDS = 4096
+
+
+def encode_varints(values, out):
+    """Append zigzag varints for values to the bytearray out"""
+    for value in values:
+        value = (value << 1) ^ (value >> 63)
+        while value > 0x7F:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(data, offset, count):
+    """Decode count zigzag varints from data, return (values, new offset)"""
+    values = []
+    for _ in range(count):
+        shift = 0
+        value = 0
+        while True:
+            b = data[offset]
+            offset += 1
+            value |= (b & 0x7F) << shift
+            if b < 0x80:
+                break
+            shift += 7
+        values.append((value >> 1) ^ -(value & 1))
+    return values, offset
+
+
+def deltas(values):
+    previous = 0
+    for value in values:
+        yield value - previous
+        previous = value
+
+
+def undeltas(values):
+    total = 0
+    result = []
+    for value in values:
+        total += value
+        result.append(total)
+    return result
+
+
+def to_seconds(dt):
+    return int((dt - EPOCH).total_seconds())
+
+
+def from_seconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def encode_chunk(records):
+    """Compress records (sorted by time) into one chunk"""
+    times = [to_seconds(r.timestamp) for r in records]
+    numbers = [r.number for r in records]
+    values = [round(r.concentration * CONCENTRATION_SCALE) for r in records]
+
+    raw = bytearray()
+    encode_varints([len(records)], raw)
+    encode_varints(deltas(times), raw)
+    encode_varints(deltas(numbers), raw)
+    encode_varints(values, raw)
+    return zlib.compress(bytes(raw), 9), times[0], times[-1]
+
+
+def decode_chunk(blob):
+    raw = zlib.decompress(blob)
+    (count,), offset = decode_varints(raw, 0, 1)
+    times, offset = decode_varints(raw, offset, count)
+    numbers, offset = decode_varints(raw, offset, count)
+    values, offset = decode_varints(raw, offset, count)
+    return [Record(number, from_seconds(seconds), value / CONCENTRATION_SCALE)
+            for seconds, number, value in zip(undeltas(times), undeltas(numbers), values)]
+
+
+def segment_before(f, end):
+    """Return (segment, previous footer end) for a footer ending at end, or None"""
+    if end < len(MAGIC) + FOOTER.size:
+        return None
+    f.seek(end - FOOTER.size)
+    offset, previous, magic = FOOTER.unpack(f.read(FOOTER.size))
+    if magic != MAGIC or not len(MAGIC) <= offset <= end - FOOTER.size:
+        return None
+    if previous > offset or 0 < previous < len(MAGIC) + FOOTER.size:
+        return None
+    f.seek(offset)
+    try:
+        segment = json.loads(f.read(end - FOOTER.size - offset))
+    except ValueError:
+        return None
+    if not isinstance(segment, dict) or 'entries' not in segment:
+        return None
+    return segment, previous
+
+
+def last_footer(f):
+    """
+    End offset of the last intact footer.
+
+    Normally that is the end of the file. After an interrupted append
+    the file ends in partial chunks or a partial segment instead, and
+    the last footer before them is found by scanning back for MAGIC.
+    """
+    f.seek(0)
+    head = f.read(len(MAGIC))
+    if head != MAGIC:
+        raise ValueError("Not an archive: bad magic")
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if segment_before(f, size) is not None:
+        return size
+
+    f.seek(0)
+    data = f.read()
+    pos = data.rfind(MAGIC, len(MAGIC))
+    while pos > 0:
+        end = pos + len(MAGIC)
+        if segment_before(f, end) is not None:
+            return end
+        pos = data.rfind(MAGIC, len(MAGIC), pos + len(MAGIC) - 1)
+    raise ValueError("Not an archive: no intact footer")
+
+
+def read_index(f):
+    """Return (index entries, meta, end of the last footer) for an open archive"""
+    end = last_footer(f)
+    segments = []
+    position = end
+    while position:
+        found = segment_before(f, position)
+        if found is None:
+            raise ValueError(f"Corrupt archive: broken index chain at {position}")
+        segment, position = found
+        segments.append(segment)
+    segments.reverse()
+    index = [entry for segment in segments for entry in segment['entries']]
+    return index, segments[-1].get('meta', {}), end
+
+
+class ArchiveWriter:
+    """
+    Append chunks to a new or existing archive.
+
+    Nothing becomes visible to readers until close() writes the index
+    segment and footer. Leaving a with block on an exception (Ctrl-C
+    included) calls abort() instead, which cuts the file back to how it
+    was opened.
+
+    meta is a small JSON dict stored with the index; pack keeps its
+    import watermarks there, so progress commits together with the data.
+    """
+
+    def __init__(self, path, chunk_records=CHUNK_RECORDS):
+        self.path = path
+        self.chunk_records = chunk_records
+        self.buffers = defaultdict(list)
+        self.entries = []
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.created = False
+            self.f = open(path, "r+b")
+            self.index, self.meta, self.start = read_index(self.f)
+            # Only drops the debris of an interrupted append, if any
+            self.f.seek(self.start)
+            self.f.truncate()
+        else:
+            self.created = True
+            self.f = open(path, "wb")
+            self.f.write(MAGIC)
+            self.index, self.meta, self.start = [], {}, 0
+        self.meta_at_open = json.dumps(self.meta, sort_keys=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, device_id, records):
+        buffer = self.buffers[device_id]
+        buffer.extend(records)
+        while len(buffer) >= self.chunk_records:
+            self._write_chunk(device_id, buffer[:self.chunk_records])
+            del buffer[:self.chunk_records]
+
+    def copy_chunk(self, entry, blob):
+        """Add an already encoded chunk unchanged (used by compact)"""
+        self.entries.append(dict(entry, offset=self.f.tell()))
+        self.f.write(blob)
+
+    def _write_chunk(self, device_id, records):
+        records = sorted(records, key=lambda r: (r.timestamp, r.number))
+        blob, t_min, t_max = encode_chunk(records)
+        self.entries.append({
+            'device': device_id,
+            'offset': self.f.tell(),
+            'size': len(blob),
+            'count': len(records),
+            't_min': t_min,
+            't_max': t_max,
+        })
+        self.f.write(blob)
+
+    def close(self):
+        for device_id, buffer in self.buffers.items():
+            if buffer:
+                self._write_chunk(device_id, buffer)
+        self.buffers.clear()
+
+        if (self.entries or self.created
+                or json.dumps(self.meta, sort_keys=True) != self.meta_at_open):
+            segment_offset = self.f.tell()
+            segment = {'entries': self.entries, 'meta': self.meta}
+            self.f.write(json.dumps(segment, separators=(",", ":")).encode())
+            # Chunks and segment must be on disk before the footer points at them
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.f.write(FOOTER.pack(segment_offset, self.start, MAGIC))
+            self.f.flush()
+            os.fsync(self.f.fileno())
+        self.f.close()
+        self.index += self.entries
+        self.entries = []
+
+    def abort(self):
+        """Forget everything added since opening; the file is left as it was"""
+        self.buffers.clear()
+        self.entries = []
+        if self.created:
+            self.f.close()
+            os.remove(self.path)
+        else:
+            self.f.truncate(self.start)
+            self.f.close()
+
+
+def needs_compaction(index, chunk_records=CHUNK_RECORDS):
+    """True once a device's partial chunks add up to at least one full chunk"""
+    partial = defaultdict(lambda: [0, 0])
+    for entry in index:
+        if entry['count'] < chunk_records:
+            totals = partial[entry['device']]
+            totals[0] += 1
+            totals[1] += entry['count']
+    return any(chunks > 1 and records >= chunk_records
+               for chunks, records in partial.values())
+
+
+def compact(path, chunk_records=CHUNK_RECORDS):
+    """
+    Rewrite the archive with each device's partial chunks merged and one
+    index segment.
+
+    Full chunks are copied without decoding. The rewritten file replaces
+    the old one with os.replace, so a crash leaves one or the other.
+    """
+    tmp = path + ".compact"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with ArchiveReader(path) as reader, ArchiveWriter(tmp, chunk_records) as out:
+        out.meta = reader.meta
+        for entry in reader.index:
+            reader.f.seek(entry['offset'])
+            blob = reader.f.read(entry['size'])
+            if entry['count'] >= chunk_records:
+                out.copy_chunk(entry, blob)
+            else:
+                out.add(entry['device'], decode_chunk(blob))
+    os.replace(tmp, path)
+
+
+def compact_if_needed(path, chunk_records=CHUNK_RECORDS):
+    with ArchiveReader(path) as reader:
+        index = reader.index
+    if not needs_compaction(index, chunk_records):
+        return False
+    compact(path, chunk_records)
+    return True
+
+
+class ArchiveReader:
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.index, self.meta, _ = read_index(self.f)
+        self.chunks_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.f.close()
+
+    def devices(self):
+        return sorted({entry['device'] for entry in self.index})
+
+    def read(self, device_id=None, start=None, end=None):
+        """
+        Yield (device_id, Record) with start <= timestamp < end.
+
+        Only chunks whose [t_min, t_max] overlaps the range are read.
+        """
+        lo = to_seconds(start) if start else None
+        hi = to_seconds(end) if end else None
+        for entry in self.index:
+            if device_id is not None and entry['device'] != device_id:
+                continue
+            if lo is not None and entry['t_max'] < lo:
+                continue
+            if hi is not None and entry['t_min'] >= hi:
+                continue
+
+            self.f.seek(entry['offset'])
+            self.chunks_read += 1
+            for record in decode_chunk(self.f.read(entry['size'])):
+                if start and record.timestamp < start:
+                    continue
+                if end and record.timestamp >= end:
+                    continue
+                yield entry['device'], record
+
+
+def synthetic_days(devices=10, days=365, per_day=250):
+    """Yield one [(device_id, [Record])] list per day, like a depot's output"""
+    start = datetime(2025, 1, 1)
+    numbers = [0] * devices
+    for day in range(days):
+        batches = []
+        for d in range(devices):
+            when = start + timedelta(days=day, hours=5)
+            records = []
+            for _ in range(per_day):
+                numbers[d] += 1
+                when += timedelta(seconds=random.randint(30, 240))
+                value = 0.0 if random.random() < 0.92 else round(random.uniform(0.01, 1.5), 3)
+                records.append(Record(numbers[d], when, value))
+            batches.append((f"K1-{d:03d}", records))
+        yield batches
+
+
+def bench(args):
+    """
+    Compare archive size and scan time with CSV on synthetic data.
+
+    Like pack run once a day: one append per day, compacting when due.
+    """
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "records.csv")
+        arc_path = os.path.join(tmp, "records.arc")
+
+        start = time.perf_counter()
+        compactions = 0
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["device", "number", "timestamp", "concentration"])
+            for batches in synthetic_days(args.devices, args.days):
+                with ArchiveWriter(arc_path) as arc:
+                    for device_id, records in batches:
+                        for r in records:
+                            writer.writerow([device_id, r.number,
+                                             r.timestamp.isoformat(sep=" "),
+                                             f"{r.concentration:.3f}"])
+                        arc.add(device_id, records)
+                compactions += compact_if_needed(arc_path)
+        print(f"Wrote {args.devices} devices x {args.days} daily appends "
+              f"in {time.perf_counter() - start:.1f}s ({compactions} compactions)")
+
+        csv_size = os.path.getsize(csv_path)
+        arc_size = os.path.getsize(arc_path)
+        print(f"  CSV:     {csv_size / 1e6:8.2f} MB")
+        print(f"  Archive: {arc_size / 1e6:8.2f} MB  ({csv_size / arc_size:.1f}x smaller)")
+
+        # One week for one device
+        lo = datetime(2025, 1, 1) + timedelta(days=args.days // 2)
+        hi = lo + timedelta(days=7)
+
+        start = time.perf_counter()
+        with open(csv_path, newline="") as f:
+            rows = [row for row in csv.DictReader(f)
+                    if row["device"] == "K1-000"
+                    and lo <= datetime.fromisoformat(row["timestamp"]) < hi]
+        csv_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ArchiveReader(arc_path) as reader:
+            found = list(reader.read("K1-000", lo, hi))
+            chunks = reader.chunks_read
+            total_chunks = len(reader.index)
+        arc_time = time.perf_counter() - start
+
+        print(f"  Range scan (1 device, 7 days, {len(found)} records):")
+        print(f"    CSV:     {csv_time * 1000:8.1f} ms")
+        print(f"    Archive: {arc_time * 1000:8.1f} ms  "
+              f"({chunks} of {total_chunks} chunks decompressed)")
+        assert len(rows) == len(found)
+
+
+def pack(args):
+    """
+    Append records imported into a RecordStore since the last pack.
+
+    Progress is an import watermark (records rowid) per store, kept in
+    the archive's own index meta, not the highest record number, so
+    records imported out of order or after a counter reset are archived
+    too. Watermark and chunks commit in one footer write: an interrupted
+    pack leaves both as they were and is simply redone.
+    """
+    from record_store import RecordStore
+
+    store = RecordStore(args.store)
+    source = os.path.abspath(args.store)
+    total = 0
+    with ArchiveWriter(args.archive) as arc:
+        watermarks = arc.meta.setdefault('watermarks', {})
+        watermark = watermarks.get(source, 0)
+        for rowid, row in store.iter_imported(watermark):
+            arc.add(row['device_id'], [Record(row['number'],
+                                              datetime.fromisoformat(row['timestamp']),
+                                              row['concentration'])])
+            watermark = rowid
+            total += 1
+        watermarks[source] = watermark
+    print(f"Archived {total} records to {args.archive}")
+    if compact_if_needed(args.archive):
+        print("Compacted partial chunks")
+
+
+def compact_command(args):
+    before = os.path.getsize(args.archive)
+    compact(args.archive)
+    print(f"Compacted {args.archive}: {before / 1e6:.2f} MB -> "
+          f"{os.path.getsize(args.archive) / 1e6:.2f} MB")
+
+
+def dump(args):
+    start = datetime.fromisoformat(args.since) if args.since else None
+    end = datetime.fromisoformat(args.until) if args.until else None
+    writer = csv.writer(sys.stdout)
+    with ArchiveReader(args.archive) as reader:
+        for device_id, r in reader.read(args.device, start, end):
+            writer.writerow([device_id, r.number, r.timestamp.isoformat(sep=" "),
+                             f"{r.concentration:.3f}"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-term record archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pack", help="Append a record store to an archive")
+    p.add_argument("store")
+    p.add_argument("archive")
+    p.set_defaults(func=pack)
+
+    p = sub.add_parser("compact", help="Merge partial chunks left by appends")
+    p.add_argument("archive")
+    p.set_defaults(func=compact_command)
+
+    p = sub.add_parser("dump", help="Print archived records as CSV")
+    p.add_argument("archive")
+    p.add_argument("--device")
+    p.add_argument("--since", help="ISO date/time, inclusive")
+    p.add_argument("--until", help="ISO date/time, exclusive")
+    p.set_defaults(func=dump)
+
+    p = sub.add_parser("bench", help="Compare with CSV on synthetic data")
+    p.add_argument("--devices", type=int, default=5)
+    p.add_argument("--days", type=int, default=365)
+    p.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Device Configuration Tool - clock and machine number
+
+Implements the PC tool's 机器号 (machine number) 设置/获取 (set/get) and
+更新时钟 (update clock) functions using the 0x20/0x21 Get/Set Time
+commands, and pushes one configuration to many ports in parallel.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from protocol import (
+    CMD_GET_MACHINE_NO,
+    CMD_GET_TIME,
+    CMD_SET_MACHINE_NO,
+    CMD_SET_TIME,
+    FrameError,
+    decode_time,
+    encode_time,
+)
+from reliable_link import LinkError, ReliableLink
+
+# Drift (seconds) above which sync_clock rewrites the device clock.
+# The clock has one second resolution, so anything under that is noise.
+DEFAULT_MAX_DRIFT = 2.0
+# The device reports whole seconds, i.e. on average half a second behind
+CLOCK_TRUNCATION = 0.5
+
+
+class DeviceConfigError(Exception):
+    """Raised when the device does not answer a configuration command"""
+
+
+class DeviceConfig:
+    def __init__(self, port=None, baudrate=9600, max_retries=2):
+        self.link = ReliableLink(port, baudrate, max_retries=max_retries)
+
+    @property
+    def port(self):
+        return self.link.port
+
+    def connect(self):
+        try:
+            self.link.open()
+        except OSError as e:
+            print(f"Connection failed: {e}")
+            return False
+        return True
+
+    def disconnect(self):
+        self.link.close()
+
+    def request(self, cmd_code, data=b""):
+        """Send a framed command and return the payload of the reply"""
+        try:
+            return self.link.request(cmd_code, data)
+        except LinkError as e:
+            raise DeviceConfigError(str(e))
+
+    def get_time(self):
+        """Read the device clock"""
+        return decode_time(self.request(CMD_GET_TIME))
+
+    def set_time(self, dt=None):
+        """Write the device clock (defaults to the host clock)"""
+        if dt is None:
+            # Round to the nearest second, the device has no sub-second field
+            dt = datetime.now() + timedelta(milliseconds=500)
+            dt = dt.replace(microsecond=0)
+        self.request(CMD_SET_TIME, encode_time(dt))
+        return dt
+
+    def get_machine_number(self):
+        """Read the machine number (16-bit big endian)"""
+        payload = self.request(CMD_GET_MACHINE_NO)
+        if len(payload) < 2:
+            raise DeviceConfigError(f"Machine number too short: {payload.hex()}")
+        return int.from_bytes(payload[:2], "big")
+
+    def set_machine_number(self, number):
+        """Write the machine number"""
+        if not 0 <= number <= 0xFFFF:
+            raise ValueError(f"Machine number out of range: {number}")
+        self.request(CMD_SET_MACHINE_NO, number.to_bytes(2, "big"))
+        return number
+
+    def measure_drift(self):
+        """
+        Return device clock minus host clock in seconds.
+
+        The reply is read frame by frame, so it returns as soon as its
+        last byte arrives and the host time can be taken at the midpoint
+        of the round trip. Only one attempt is timed: a retry would put
+        the backoff into the measurement. CLOCK_TRUNCATION corrects for
+        the device dropping the fraction of the current second.
+        """
+        sent = time.time()
+        try:
+            payload = self.link.transact(CMD_GET_TIME)
+        except (LinkError, OSError) as e:
+            raise DeviceConfigError(f"Clock read failed: {e}")
+        received = time.time()
+        host_time = datetime.fromtimestamp((sent + received) / 2)
+        device_time = decode_time(payload)
+        return (device_time - host_time).total_seconds() + CLOCK_TRUNCATION
+
+    def sync_clock(self, max_drift=DEFAULT_MAX_DRIFT):
+        """
+        Correct the device clock if it drifted by more than max_drift.
+
+        Returns (drift_before, drift_after). drift_after equals
+        drift_before when no correction was needed.
+        """
+        drift = self.measure_drift()
+        if abs(drift) <= max_drift:
+            return drift, drift
+
+        self.set_time()
+        return drift, self.measure_drift()
+
+    def apply(self, config):
+        """
+        Apply a configuration dict and return a result dict.
+
+        Supported keys:
+            machine_number      - int to write (read back to confirm)
+            read_machine_number - True to read it without writing
+            sync_clock          - True to check and correct the clock
+            max_drift           - threshold for sync_clock in seconds
+
+        Only the commands a key asks for are sent, so a device that does
+        not answer the (unconfirmed) machine number codes can still have
+        its clock synced.
+        """
+        result = {'port': self.port}
+
+        if config.get('machine_number') is not None:
+            self.set_machine_number(config['machine_number'])
+            result['machine_number'] = self.get_machine_number()
+        elif config.get('read_machine_number'):
+            result['machine_number'] = self.get_machine_number()
+
+        if config.get('sync_clock'):
+            max_drift = config.get('max_drift', DEFAULT_MAX_DRIFT)
+            before, after = self.sync_clock(max_drift)
+            result['drift_before'] = before
+            result['drift_after'] = after
+        return result
+
+
+def configure_device(port, config, baudrate=9600):
+    """Connect to one port, apply config and always disconnect"""
+    device = DeviceConfig(port, baudrate)
+    try:
+        if not device.connect():
+            return {'port': port, 'error': "Connection failed"}
+        return device.apply(config)
+    except (DeviceConfigError, FrameError) as e:
+        return {'port': port, 'error': str(e)}
+    except Exception as e:
+        # Anything else (a bad URL, a driver bug) still only fails this
+        # port, so the rest of the fleet keeps its results
+        return {'port': port, 'error': f"{type(e).__name__}: {e}"}
+    finally:
+        device.disconnect()
+
+
+def configure_fleet(ports, config, baudrate=9600, max_workers=8):
+    """
+    Push config to every port in parallel.
+
+    config['machine_number'] may be a dict of port -> number so each
+    device keeps its own number while sharing the rest of the settings.
+    Returns a list of result dicts in the same order as ports.
+    """
+    def port_config(port):
+        numbers = config.get('machine_number')
+        if isinstance(numbers, dict):
+            return dict(config, machine_number=numbers.get(port))
+        return config
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(configure_device, port, port_config(port), baudrate)
+                   for port in ports]
+        return [f.result() for f in futures]
+
+
+def print_results(results):
+    print("\n" + "=" * 60)
+    print("Configuration results")
+    print("=" * 60)
+    for r in results:
+        if 'error' in r:
+            print(f"  {r['port']}: FAILED - {r['error']}")
+            continue
+        parts = []
+        if 'machine_number' in r:
+            parts.append(f"machine #{r['machine_number']}")
+        if 'drift_before' in r:
+            parts.append(f"drift {r['drift_before']:+.1f}s -> {r['drift_after']:+.1f}s")
+        print(f"  {r['port']}: {', '.join(parts) or 'OK'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Configure alcohol testers")
+    parser.add_argument("ports", nargs="+", help="Serial ports to configure")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--machine-number", type=int,
+                        help="Machine number to write (single port only)")
+    parser.add_argument("--read-machine-number", action="store_true",
+                        help="Read the machine number (default when nothing "
+                             "else is asked for)")
+    parser.add_argument("--sync-clock", action="store_true",
+                        help="Measure clock drift and correct it")
+    parser.add_argument("--max-drift", type=float, default=DEFAULT_MAX_DRIFT)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.machine_number is not None and len(args.ports) > 1:
+        parser.error("--machine-number can only be set on one port at a time")
+
+    config = {
+        'machine_number': args.machine_number,
+        'read_machine_number': args.read_machine_number or not args.sync_clock,
+        'sync_clock': args.sync_clock,
+        'max_drift': args.max_drift,
+    }
+    print_results(configure_fleet(args.ports, config, args.baud, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
-import serial
+import argparse
 import time
 import sys
 
+from profiling import add_profile_argument, run_maybe_profiled
+from transports import open_transport
+
 # Common baud rates
 BAUD_RATES = [9600, 115200, 57600, 38400, 19200, 4800]
 
@@ -14,14 +17,13 @@ COMMANDS = [
     (b'\xA5\x05\x0D\x0A', "A5 Read Records"),
 ]
 
-def scan():
-    port = "/dev/cu.usbserial-1130"
+def scan(port="/dev/cu.usbserial-1130"):
     print(f"Scanning on {port}...")
     
     for baud in BAUD_RATES:
         print(f"Trying {baud}...")
         try:
-            with serial.Serial(port, baud, timeout=0.2) as ser:
+            with open_transport(port, baud, timeout=0.2) as ser:
                 ser.dtr = True
                 ser.rts = True
                 # Flush
@@ -50,4 +52,8 @@ def scan():
     return None
 
 if __name__ == "__main__":
-    scan()
+    parser = argparse.ArgumentParser(description="Fast baud rate scan")
+    parser.add_argument("port", nargs="?", default="/dev/cu.usbserial-1130")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    run_maybe_profiled(args, scan, args.port, name="scan")
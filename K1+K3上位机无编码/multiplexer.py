@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Port Multiplexer - commands and passive monitoring on one open port
+
+send_raw clears the input buffer before every command, which throws away
+readings the device pushes when its button is pressed. The multiplexer
+instead owns the transport and runs a single reader thread:
+
+- complete FA F5 frames are matched to outstanding requests by command
+  code (oldest request first)
+- frames nobody asked for go to frame subscribers
+- bytes outside any frame go to raw subscribers, like serial_monitor shows
+- if the transport dies, outstanding requests fail at once and the port
+  is reopened with capped exponential backoff
+
+ReliableLink(..., mux=mux) sends its requests through the multiplexer,
+so scheduled downloads can run while live capture keeps listening.
+"""
+
+import argparse
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from protocol import (
+    HEADER,
+    MAX_FRAME_SIZE,
+    ChecksumError,
+    FrameError,
+    build_frame,
+    parse_frame,
+)
+from reliable_link import LinkTimeout, ReliableLink, download
+from transports import TransportError, open_transport
+
+# Reopen attempts after the transport fails, and their backoff (seconds)
+RECONNECT_ATTEMPTS = 10
+RECONNECT_BASE_DELAY = 0.1
+RECONNECT_MAX_DELAY = 2.0
+
+
+class PortMultiplexer:
+    def __init__(self, port, baudrate=9600):
+        self.port = port
+        self.baudrate = baudrate
+        self.transport = None
+        self.thread = None
+        self.running = False
+        self.pending = defaultdict(deque)
+        self.pending_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.frame_subscribers = []
+        self.raw_subscribers = []
+        self.stats = {
+            'frames': 0,
+            'replies': 0,
+            'unsolicited': 0,
+            'checksum_errors': 0,
+            'raw_bytes': 0,
+            'reconnects': 0,
+            'subscriber_errors': 0,
+        }
+
+    def open(self):
+        transport = open_transport(self.port, self.baudrate, timeout=0.05)
+        if not transport.is_open:
+            raise TransportError(f"{self.port} is closed")
+        with self.write_lock:
+            self.transport = transport
+
+    def start(self):
+        self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        if self.transport and self.transport.is_open:
+            self.transport.close()
+        with self.pending_lock:
+            for waiters in self.pending.values():
+                for future in waiters:
+                    future.cancel()
+            self.pending.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def subscribe(self, callback, cmd_codes=None):
+        """
+        Call callback(cmd_code, data) for unsolicited frames.
+
+        cmd_codes limits the subscription to those codes. Returns a
+        function that removes the subscription.
+        """
+        entry = (callback, set(cmd_codes) if cmd_codes is not None else None)
+        self.frame_subscribers.append(entry)
+        return lambda: self.frame_subscribers.remove(entry)
+
+    def subscribe_raw(self, callback):
+        """Call callback(data) for bytes that are not part of a frame"""
+        self.raw_subscribers.append(callback)
+        return lambda: self.raw_subscribers.remove(callback)
+
+    def request(self, cmd_code, data=b"", timeout=1.0):
+        """Send a framed command and wait for the reply with the same code"""
+        future = Future()
+        with self.pending_lock:
+            self.pending[cmd_code].append(future)
+
+        try:
+            with self.write_lock:
+                if not self.running:
+                    raise TransportError(f"Multiplexer on {self.port} is stopped")
+                self.transport.write(build_frame(cmd_code, data))
+                self.transport.flush()
+            return future.result(timeout)
+        except FutureTimeout:
+            raise LinkTimeout(f"No reply to 0x{cmd_code:02X} within {timeout}s")
+        finally:
+            with self.pending_lock:
+                waiters = self.pending.get(cmd_code)
+                if waiters and future in waiters:
+                    waiters.remove(future)
+
+    def _reader(self):
+        buffer = bytearray()
+        while self.running:
+            try:
+                chunk = self.transport.read(self.transport.in_waiting or 1)
+            except OSError as e:
+                print(f"Multiplexer read error: {e}")
+                buffer.clear()
+                # Requests on the dead transport will never be answered
+                self._fail_all(e)
+                self._reconnect()
+                continue
+            if not chunk:
+                continue
+            buffer.extend(chunk)
+            self._drain(buffer)
+
+    def _reconnect(self):
+        """Reopen the transport with backoff; stop the multiplexer if that fails"""
+        try:
+            self.transport.close()
+        except OSError:
+            pass
+        for attempt in range(RECONNECT_ATTEMPTS):
+            time.sleep(min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * (2 ** attempt)))
+            if not self.running:
+                return
+            try:
+                self.open()
+            except OSError:
+                continue
+            self.stats['reconnects'] += 1
+            print(f"Multiplexer reconnected to {self.port}")
+            return
+        print(f"Multiplexer giving up on {self.port}")
+        self.running = False
+        self._fail_all(TransportError(f"Could not reopen {self.port}"))
+
+    def _drain(self, buffer):
+        """Dispatch every complete frame in buffer and drop consumed bytes"""
+        while True:
+            start = buffer.find(HEADER)
+            if start < 0:
+                # Keep a trailing 0xFA, it may be the first half of a header
+                keep = 1 if buffer[-1:] == HEADER[:1] else 0
+                self._dispatch_raw(buffer, len(buffer) - keep)
+                return
+            if start > 0:
+                self._dispatch_raw(buffer, start)
+                continue
+
+            try:
+                frame = parse_frame(buffer)
+            except ChecksumError as e:
+                self.stats['checksum_errors'] += 1
+                self._fail_pending(buffer[3] if len(buffer) > 3 else None, e)
+                del buffer[:e.end]
+                continue
+            except FrameError as e:
+                # Not a real header (e.g. line noise FA F5 00)
+                self._dispatch_raw(buffer, e.end)
+                continue
+
+            if frame is None:
+                if len(buffer) > MAX_FRAME_SIZE:
+                    # Cannot happen for a real header; skip it and resync
+                    self._dispatch_raw(buffer, len(HEADER))
+                    continue
+                return
+
+            cmd_code, data, end = frame
+            del buffer[:end]
+            self._dispatch_frame(cmd_code, data)
+
+    def _dispatch_raw(self, buffer, count):
+        if count <= 0:
+            return
+        data = bytes(buffer[:count])
+        del buffer[:count]
+        self.stats['raw_bytes'] += len(data)
+        for callback in list(self.raw_subscribers):
+            self._notify(callback, data)
+
+    def _dispatch_frame(self, cmd_code, data):
+        self.stats['frames'] += 1
+        with self.pending_lock:
+            waiters = self.pending.get(cmd_code)
+            future = waiters.popleft() if waiters else None
+
+        if future is not None:
+            self.stats['replies'] += 1
+            future.set_result(data)
+            return
+
+        self.stats['unsolicited'] += 1
+        for callback, codes in list(self.frame_subscribers):
+            if codes is None or cmd_code in codes:
+                self._notify(callback, cmd_code, data)
+
+    def _notify(self, callback, *args):
+        """Run a subscriber; a failing one must not kill the reader thread"""
+        try:
+            callback(*args)
+        except Exception as e:
+            self.stats['subscriber_errors'] += 1
+            print(f"Multiplexer subscriber {getattr(callback, '__name__', callback)} "
+                  f"failed: {e!r}")
+
+    def _fail_pending(self, cmd_code, error):
+        """Fail the oldest request for a corrupted reply so it retries now"""
+        with self.pending_lock:
+            waiters = self.pending.get(cmd_code)
+            future = waiters.popleft() if waiters else None
+        if future is not None:
+            future.set_exception(error)
+
+    def _fail_all(self, error):
+        """Fail every outstanding request, e.g. when the transport died"""
+        with self.pending_lock:
+            futures = [f for waiters in self.pending.values() for f in waiters]
+            self.pending.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Monitor a device and download records on one port")
+    parser.add_argument("port", help="COM port or tcp://host:port")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--download-every", type=float, default=0,
+                        help="Seconds between record downloads (0 = never)")
+    args = parser.parse_args()
+
+    def on_frame(cmd_code, data):
+        timestamp = time.strftime("%H:%M:%S")
+        print(f"[{timestamp}] Unsolicited 0x{cmd_code:02X}: {data.hex()}")
+
+    def on_raw(data):
+        timestamp = time.strftime("%H:%M:%S")
+        print(f"[{timestamp}] Raw {len(data)} bytes: {data.hex()} | {repr(data)}")
+
+    with PortMultiplexer(args.port, args.baud) as mux:
+        mux.subscribe(on_frame)
+        mux.subscribe_raw(on_raw)
+        print(f"Listening on {args.port} for {args.duration:.0f}s "
+              "(press the device button to push a reading)")
+
+        end = time.monotonic() + args.duration
+        next_download = time.monotonic()
+        while time.monotonic() < end:
+            if args.download_every and time.monotonic() >= next_download:
+                download(ReliableLink(args.port, args.baud, mux=mux))
+                next_download = time.monotonic() + args.download_every
+            time.sleep(0.2)
+
+        print("Multiplexer statistics:")
+        for name, value in mux.stats.items():
+            print(f"  {name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Profiling helpers for the scan, probe and download entry points
+
+profile_run() wraps a call with:
+- cProfile, dumped as <name>.prof (open with pstats or snakeviz)
+- a sampling profiler, written as <name>.collapsed in the "folded stacks"
+  format read by flamegraph.pl, inferno and speedscope
+- a time.sleep hook, so fixed waits show up as a [sleep] frame and the
+  summary can split wall-clock time into sleep, CPU and other waiting
+  (mostly blocking serial reads)
+
+The scripts expose this as --profile [DIR].
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+SLEEP_FRAME = "[sleep]"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.sleeping = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._fold(frame)] += 1
+            time.sleep(self.interval)
+
+    def _fold(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                         f":{code.co_firstlineno})")
+            frame = frame.f_back
+        names.reverse()
+        if self.sleeping:
+            names.append(SLEEP_FRAME)
+        return ";".join(names)
+
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class SleepTracker:
+    """Replaces time.sleep while active to total the time spent sleeping"""
+
+    def __init__(self, sampler=None):
+        self.sampler = sampler
+        self.total = 0.0
+        self.calls = 0
+        self.original = None
+
+    def __enter__(self):
+        self.original = time.sleep
+        original = self.original
+
+        def tracked_sleep(seconds):
+            # Only the profiled thread counts; the sampler sleeps too
+            if threading.get_ident() != self.sampler.thread_id:
+                return original(seconds)
+            self.sampler.sleeping = True
+            start = time.perf_counter()
+            try:
+                original(seconds)
+            finally:
+                self.total += time.perf_counter() - start
+                self.calls += 1
+                self.sampler.sleeping = False
+
+        time.sleep = tracked_sleep
+        return self
+
+    def __exit__(self, *exc):
+        time.sleep = self.original
+
+
+def profile_run(func, *args, name="run", output_dir="profiles", top=20,
+                interval=0.005, **kwargs):
+    """Run func(*args, **kwargs) under both profilers and print a summary"""
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+    sampler = SamplingProfiler(threading.get_ident(), interval)
+    profiler = cProfile.Profile()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    with SleepTracker(sampler) as sleeps:
+        sampler.start()
+        profiler.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            sampler.stop()
+    wall = time.perf_counter() - wall_start
+    # process_time includes the sampler thread; close enough at 5 ms sampling
+    cpu = time.process_time() - cpu_start
+
+    profiler.dump_stats(base + ".prof")
+    sampler.write_collapsed(base + ".collapsed")
+
+    print("\n" + "=" * 60)
+    print(f"Profile: {name}")
+    print("=" * 60)
+    print(f"  Wall clock:     {wall:8.3f} s")
+    print(f"  Sleep:          {sleeps.total:8.3f} s  ({sleeps.calls} calls)")
+    print(f"  CPU:            {cpu:8.3f} s")
+    print(f"  Other waiting:  {max(0.0, wall - sleeps.total - cpu):8.3f} s  "
+          f"(serial/socket reads)")
+    print(f"  Samples:        {sum(sampler.stacks.values())}")
+    print(f"\n  cProfile:   {base}.prof")
+    print(f"  Flamegraph: {base}.collapsed  (flamegraph.pl / speedscope)")
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("tottime").print_stats(top)
+    print(f"\nTop {top} functions by own time:")
+    print(out.getvalue())
+    return result
+
+
+def add_profile_argument(parser):
+    """Add the shared --profile [DIR] option to an argparse parser"""
+    parser.add_argument("--profile", nargs="?", const="profiles", metavar="DIR",
+                        help="Profile the run and write output to DIR "
+                             "(default: profiles)")
+
+
+def run_maybe_profiled(args, func, *func_args, name="run", **kwargs):
+    """Call func directly, or under profile_run when --profile was given"""
+    if args.profile:
+        return profile_run(func, *func_args, name=name,
+                           output_dir=args.profile, **kwargs)
+    return func(*func_args, **kwargs)
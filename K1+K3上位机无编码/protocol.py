@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Framed protocol helpers for the K1/K3 alcohol tester
+
+Frame layout (Format2_LEN_XOR in alcohol_tester_reader.build_command):
+    FA F5 | LEN | CMD | DATA ... | XOR
+
+- LEN counts the CMD byte plus DATA
+- XOR is the XOR of every preceding byte, header included
+
+Command codes come from the PC tool's config.ini labels
+(机器号 machine number, 设置/获取 set/get, 更新时钟 update clock) and the
+probe list in alcohol_tester_reader.py. They are not confirmed against
+a capture yet, so keep them in one place here.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+HEADER = bytes([0xFA, 0xF5])
+
+# Command codes
+CMD_RECORD_COUNT = 0x04
+CMD_READ_RECORD = 0x06
+CMD_GET_TIME = 0x20
+CMD_SET_TIME = 0x21
+CMD_GET_MACHINE_NO = 0x30
+CMD_SET_MACHINE_NO = 0x31
+
+# Header + LEN + CMD + XOR
+MIN_FRAME_SIZE = 5
+# Header + LEN + up to 255 bytes of CMD and DATA + XOR
+MAX_FRAME_SIZE = 3 + 255 + 1
+
+# Record payload: number (2) + YY MM DD hh mm ss (6) + concentration (2)
+RECORD_SIZE = 10
+# Raw concentration counts per mg/L
+CONCENTRATION_SCALE = 1000
+
+Record = namedtuple('Record', ['number', 'timestamp', 'concentration'])
+
+
+class FrameError(Exception):
+    """
+    A received frame is malformed or fails its checksum.
+
+    end is the offset just past the bad frame when known, so stream
+    readers can drop it and resynchronise on the next header.
+    """
+    def __init__(self, message, end=None):
+        super().__init__(message)
+        self.end = end
+
+
+class ChecksumError(FrameError):
+    """A complete frame arrived but its XOR checksum does not match"""
+
+
+def xor_checksum(data):
+    """XOR of all bytes in data"""
+    xor_sum = 0
+    for b in data:
+        xor_sum ^= b
+    return xor_sum
+
+
+def build_frame(cmd_code, data=b""):
+    """Build a FA F5 LEN CMD DATA XOR frame"""
+    data = bytes(data)
+    packet = HEADER + bytes([len(data) + 1, cmd_code]) + data
+    return packet + bytes([xor_checksum(packet)])
+
+
+def parse_frame(buffer):
+    """
+    Find the first complete frame in buffer.
+
+    Returns (cmd_code, data, end_offset) or None if no complete frame
+    is available yet. end_offset is the index just past the frame, so
+    callers can drop the consumed bytes.
+
+    Raises ChecksumError if a complete frame fails its checksum, and
+    FrameError (with end just past the header) for LEN 0, which no frame
+    can have since LEN includes the CMD byte.
+    """
+    start = buffer.find(HEADER)
+    if start < 0 or len(buffer) - start < MIN_FRAME_SIZE:
+        return None
+
+    length = buffer[start + 2]
+    if length == 0:
+        raise FrameError(f"Zero length byte at offset {start}", start + len(HEADER))
+    end = start + 3 + length + 1
+    if len(buffer) < end:
+        return None
+
+    expected = xor_checksum(buffer[start:end - 1])
+    if buffer[end - 1] != expected:
+        raise ChecksumError(
+            f"Checksum mismatch: got {buffer[end - 1]:02X}, "
+            f"expected {expected:02X} in {bytes(buffer[start:end]).hex()}",
+            end)
+
+    cmd_code = buffer[start + 3]
+    data = bytes(buffer[start + 4:end - 1])
+    return cmd_code, data, end
+
+
+def encode_time(dt):
+    """Encode a datetime as YY MM DD hh mm ss (binary, year - 2000)"""
+    return bytes([dt.year - 2000, dt.month, dt.day,
+                  dt.hour, dt.minute, dt.second])
+
+
+def decode_time(data):
+    """
+    Decode YY MM DD hh mm ss into a datetime.
+
+    Raises FrameError for a short or impossible time, which a frame with
+    a valid checksum can still carry (e.g. after an RTC reset).
+    """
+    if len(data) < 6:
+        raise FrameError(f"Time field too short: {bytes(data).hex()}")
+    yy, mo, dd, hh, mi, ss = data[:6]
+    try:
+        return datetime(2000 + yy, mo, dd, hh, mi, ss)
+    except ValueError as e:
+        raise FrameError(f"Bad time field {bytes(data[:6]).hex()}: {e}")
+
+
+def decode_record(data):
+    """Decode a record payload into a Record (concentration in mg/L)"""
+    if len(data) < RECORD_SIZE:
+        raise FrameError(f"Record too short: {bytes(data).hex()}")
+    number = int.from_bytes(data[0:2], "big")
+    timestamp = decode_time(data[2:8])
+    concentration = int.from_bytes(data[8:10], "big") / CONCENTRATION_SCALE
+    return Record(number, timestamp, concentration)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Record Store - SQLite store for downloaded test records
+
+Every import bumps a generation counter kept in the database, so readers
+in other processes (the API server) can tell when cached results are
+stale with a single primary-key lookup.
+
+Record numbers restart at 0 when a device's memory is cleared. Records
+are therefore keyed by (device, series, number): a number that comes
+back with a different timestamp starts a new series instead of being
+dropped as a duplicate.
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS devices (
+    device_id TEXT PRIMARY KEY,
+    last_import REAL
+);
+CREATE TABLE IF NOT EXISTS records (
+    device_id TEXT NOT NULL,
+    series INTEGER NOT NULL DEFAULT 0,
+    number INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    concentration REAL NOT NULL,
+    PRIMARY KEY (device_id, series, number)
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS records_time ON records (timestamp);
+CREATE INDEX IF NOT EXISTS records_number ON records (device_id, number);
+"""
+
+# Stores created before series existed were keyed by (device_id, number).
+# Rowids are copied so import watermarks (see iter_imported) stay valid.
+ADD_SERIES = """
+ALTER TABLE records RENAME TO records_old;
+DROP INDEX IF EXISTS records_time;
+CREATE TABLE records (
+    device_id TEXT NOT NULL,
+    series INTEGER NOT NULL DEFAULT 0,
+    number INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    concentration REAL NOT NULL,
+    PRIMARY KEY (device_id, series, number)
+);
+INSERT INTO records (rowid, device_id, series, number, timestamp, concentration)
+    SELECT rowid, device_id, 0, number, timestamp, concentration FROM records_old;
+DROP TABLE records_old;
+"""
+
+
+def normalize_time(value):
+    """
+    Convert an ISO date/time ('2026-01-02', '2026-01-02T06:00') to the
+    'YYYY-MM-DD HH:MM:SS' form timestamps are stored and compared in.
+
+    Raises ValueError for anything fromisoformat rejects.
+    """
+    return datetime.fromisoformat(value).isoformat(sep=' ')
+
+
+class RecordStore:
+    def __init__(self, path="records.db"):
+        self.path = path
+        # One connection shared between threads, serialised by lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(records)")]
+            if 'series' not in columns:
+                self.conn.executescript(ADD_SERIES)
+            self.conn.executescript(INDEXES)
+
+    def close(self):
+        self.conn.close()
+
+    def generation(self):
+        """Counter bumped by every import that added records"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0]
+
+    def import_records(self, device_id, records):
+        """
+        Insert Records for a device, skipping ones already stored.
+
+        A record is already stored if any series has the same number and
+        timestamp. If only the number is taken in the current series, the
+        device's counter was reset and a new series starts with it.
+        """
+        with self.lock, self.conn:
+            series = self.conn.execute(
+                "SELECT COALESCE(MAX(series), 0) FROM records WHERE device_id = ?",
+                (device_id,)).fetchone()[0]
+            added = 0
+            for r in records:
+                timestamp = r.timestamp.isoformat(sep=' ')
+                if self.conn.execute(
+                        "SELECT 1 FROM records WHERE device_id = ? AND number = ? "
+                        "AND timestamp = ?", (device_id, r.number, timestamp)).fetchone():
+                    continue
+                if self.conn.execute(
+                        "SELECT 1 FROM records WHERE device_id = ? AND series = ? "
+                        "AND number = ?", (device_id, series, r.number)).fetchone():
+                    series += 1
+                self.conn.execute(
+                    "INSERT INTO records (device_id, series, number, timestamp, "
+                    "concentration) VALUES (?, ?, ?, ?, ?)",
+                    (device_id, series, r.number, timestamp, r.concentration))
+                added += 1
+            self.conn.execute(
+                "INSERT INTO devices VALUES (?, ?) ON CONFLICT(device_id) "
+                "DO UPDATE SET last_import = excluded.last_import",
+                (device_id, time.time()))
+            if added:
+                self.conn.execute(
+                    "UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+        return added
+
+    def iter_imported(self, after_rowid=0, batch_size=1000):
+        """
+        Yield (rowid, record dict) for rows imported after after_rowid.
+
+        Rows are only ever inserted, so rowids grow in import order and a
+        consumer that saves the last rowid it handled sees every later
+        import exactly once, whatever the record numbers are.
+        """
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT rowid, device_id, number, timestamp, concentration "
+                "FROM records WHERE rowid > ? ORDER BY rowid", (after_rowid,))
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                record = dict(row)
+                yield record.pop('rowid'), record
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def devices(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT d.device_id, d.last_import, COUNT(r.number) AS records, "
+                "COALESCE(MAX(r.series), 0) AS counter_resets "
+                "FROM devices d LEFT JOIN records r USING (device_id) "
+                "GROUP BY d.device_id ORDER BY d.device_id").fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_records(self, device_id=None, since=None, until=None, after=None,
+                     limit=1000, batch_size=200):
+        """
+        Yield record dicts ordered by (device_id, series, number).
+
+        after is a (device_id, series, number) cursor from the previous page. Rows
+        are fetched batch_size at a time so callers can stream them.
+        """
+        clauses, params = [], []
+        if device_id is not None:
+            clauses.append("device_id = ?")
+            params.append(device_id)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(normalize_time(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(normalize_time(until))
+        if after is not None:
+            clauses.append("(device_id, series, number) > (?, ?, ?)")
+            params.extend(after)
+
+        sql = "SELECT device_id, series, number, timestamp, concentration FROM records"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY device_id, series, number LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                yield dict(row)
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def aggregates(self, device_id=None, since=None, until=None):
+        """Per-device count, mean, max and non-zero test counts"""
+        clauses, params = [], []
+        if device_id is not None:
+            clauses.append("device_id = ?")
+            params.append(device_id)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(normalize_time(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(normalize_time(until))
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT device_id, COUNT(*) AS tests, AVG(concentration) AS mean, "
+                "MAX(concentration) AS max, "
+                "SUM(concentration > 0) AS positive, "
+                "MIN(timestamp) AS first, MAX(timestamp) AS last "
+                f"FROM records{where} GROUP BY device_id ORDER BY device_id",
+                params).fetchall()
+        return [dict(row) for row in rows]
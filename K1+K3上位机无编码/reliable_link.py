@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Reliable Link - checksummed request/response with retry and reconnect
+
+send_raw / send_and_receive hand whatever bytes arrived after a fixed
+sleep straight to the parser. This layer instead:
+
+- reads until a complete FA F5 frame arrives (or a deadline passes)
+- rejects frames that fail the XOR checksum
+- retries a failed request with capped exponential backoff
+- reopens the port when the USB serial adapter glitches
+- keeps error counters so flaky cables show up in the summary
+
+Records are downloaded one index at a time, so a failure only retries
+that index and an interrupted download can resume from where it stopped.
+"""
+
+import argparse
+import time
+
+from anomaly import AnomalyDetector, format_flag
+from profiling import add_profile_argument, run_maybe_profiled
+from protocol import (
+    CMD_READ_RECORD,
+    CMD_RECORD_COUNT,
+    ChecksumError,
+    FrameError,
+    build_frame,
+    decode_record,
+    parse_frame,
+)
+from record_store import RecordStore
+from transports import TransportPool, open_transport
+
+# Records imported into the store per transaction during a download
+IMPORT_BATCH = 100
+
+
+class LinkError(Exception):
+    """A request still failed after all retries"""
+
+
+class LinkTimeout(LinkError):
+    """No complete frame arrived before the deadline"""
+
+
+class CounterReset(LinkError):
+    """The device holds fewer records than the resume index (memory cleared)"""
+
+    def __init__(self, count, start):
+        super().__init__(f"Device has {count} records but the download resumes "
+                         f"at index {start}; its memory was probably cleared")
+        self.count = count
+        self.start = start
+
+
+class ReliableLink:
+    def __init__(self, port, baudrate=9600, timeout=1.0, max_retries=5,
+                 base_delay=0.05, max_delay=2.0, mux=None, pool=None):
+        self.port = port
+        # Optional PortMultiplexer that owns the port (see multiplexer.py)
+        self.mux = mux
+        # Optional TransportPool that keeps the connection open between links
+        self.pool = pool
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.serial = None
+        self.stats = {
+            'requests': 0,
+            'frames_ok': 0,
+            'checksum_errors': 0,
+            'timeouts': 0,
+            'unexpected_replies': 0,
+            'io_errors': 0,
+            'retries': 0,
+            'reconnects': 0,
+        }
+
+    def open(self):
+        # Short read timeout: read_frame polls against its own deadline
+        if self.pool is not None:
+            self.serial = self.pool.get(self.port)
+        else:
+            self.serial = open_transport(self.port, self.baudrate, timeout=0.05)
+
+    def close(self):
+        if self.pool is not None:
+            # Leave the connection open in the pool for the next link
+            self.serial = None
+            return
+        if self.serial and self.serial.is_open:
+            try:
+                self.serial.close()
+            except OSError:
+                pass
+        self.serial = None
+
+    def reopen(self, attempts=5, delay=0.5):
+        """Close and reopen the port, waiting for the adapter to re-enumerate"""
+        if self.pool is not None:
+            self.pool.discard(self.port)
+        self.close()
+        self.stats['reconnects'] += 1
+        for attempt in range(attempts):
+            try:
+                self.open()
+                return
+            except OSError:
+                time.sleep(delay * (attempt + 1))
+        raise LinkError(f"Could not reopen {self.port}")
+
+    def backoff(self, attempt):
+        """Delay before retry number attempt (0-based), capped at max_delay"""
+        return min(self.max_delay, self.base_delay * (2 ** attempt))
+
+    def read_frame(self, deadline):
+        """Read until one complete frame arrives, return (cmd_code, data)"""
+        buffer = bytearray()
+        while time.monotonic() < deadline:
+            chunk = self.serial.read(self.serial.in_waiting or 1)
+            if not chunk:
+                continue
+            buffer.extend(chunk)
+            while True:
+                try:
+                    frame = parse_frame(buffer)
+                except ChecksumError:
+                    raise
+                except FrameError as e:
+                    # Line noise that looks like a header: skip it and resync
+                    del buffer[:e.end]
+                    continue
+                if frame is not None:
+                    cmd_code, data, _ = frame
+                    return cmd_code, data
+                break
+        raise LinkTimeout(f"Timed out with {len(buffer)} bytes: {buffer.hex()}")
+
+    def transact(self, cmd_code, data=b""):
+        """One attempt: send a frame and return the payload of the reply"""
+        if self.mux is not None:
+            payload = self.mux.request(cmd_code, data, self.timeout)
+            self.stats['frames_ok'] += 1
+            return payload
+
+        if not self.serial or not self.serial.is_open:
+            self.open()
+
+        self.serial.reset_input_buffer()
+        self.serial.write(build_frame(cmd_code, data))
+        self.serial.flush()
+
+        reply_code, payload = self.read_frame(time.monotonic() + self.timeout)
+        if reply_code != cmd_code:
+            self.stats['unexpected_replies'] += 1
+            raise FrameError(
+                f"Expected reply to 0x{cmd_code:02X}, got 0x{reply_code:02X}")
+        self.stats['frames_ok'] += 1
+        return payload
+
+    def request(self, cmd_code, data=b"", decode=None):
+        """
+        Send a command, retrying with backoff until a valid reply arrives.
+
+        decode(payload) runs inside the retry loop, so a reply that passes
+        the checksum but decodes to nonsense (FrameError) is asked for again.
+        """
+        self.stats['requests'] += 1
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                time.sleep(self.backoff(attempt - 1))
+            try:
+                payload = self.transact(cmd_code, data)
+                return decode(payload) if decode else payload
+            except LinkTimeout as e:
+                self.stats['timeouts'] += 1
+                last_error = e
+            except ChecksumError as e:
+                self.stats['checksum_errors'] += 1
+                last_error = e
+            except FrameError as e:
+                last_error = e
+            except OSError as e:
+                # USB glitch: the handle is usually dead, get a fresh one
+                self.stats['io_errors'] += 1
+                last_error = e
+                if self.mux is not None:
+                    # The multiplexer's reader thread reopens the port itself
+                    continue
+                try:
+                    self.reopen()
+                except LinkError as reopen_error:
+                    last_error = reopen_error
+
+        raise LinkError(
+            f"Command 0x{cmd_code:02X} failed after {self.max_retries + 1} "
+            f"attempts: {last_error}")
+
+    def read_record_count(self):
+        payload = self.request(CMD_RECORD_COUNT)
+        if len(payload) < 2:
+            raise FrameError(f"Record count too short: {payload.hex()}")
+        return int.from_bytes(payload[:2], "big")
+
+    def read_record(self, index):
+        return self.request(CMD_READ_RECORD, index.to_bytes(2, "big"), decode_record)
+
+    def download_records(self, start=0, count=None):
+        """
+        Yield (index, Record) from start onwards.
+
+        Each index is retried on its own; if one still fails the LinkError
+        propagates and the caller can resume with start=<failed index>.
+        Raises CounterReset if the device has fewer than start records.
+        """
+        if count is None:
+            total = self.read_record_count()
+            if total < start:
+                raise CounterReset(total, start)
+            count = total - start
+        for index in range(start, start + count):
+            yield index, self.read_record(index)
+
+    def print_stats(self):
+        print("Link statistics:")
+        for name, value in self.stats.items():
+            print(f"  {name}: {value}")
+
+
+def download(link, start=0, store=None, device_id=None, detector=None):
+    """
+    Download and print records, reporting where to resume on failure.
+
+    Returns the index to resume from: 0 again after a CounterReset, so a
+    repeated download starts over on the device's new records.
+
+    With a RecordStore, records are imported in batches as they arrive,
+    so whatever was downloaded before a failure is kept. With an
+    AnomalyDetector, flags are printed right after the record that
+    raised them.
+    """
+    next_index = start
+    pending = []
+    try:
+        for index, record in link.download_records(start):
+            print(f"#{record.number:5d}  {record.timestamp:%Y-%m-%d %H:%M:%S}  "
+                  f"{record.concentration:.3f} mg/L")
+            if detector is not None:
+                for flag in detector.process(device_id, (record,)):
+                    print(format_flag(flag))
+            next_index = index + 1
+            if store is not None:
+                pending.append(record)
+                if len(pending) >= IMPORT_BATCH:
+                    store.import_records(device_id, pending)
+                    pending = []
+    except CounterReset as e:
+        print(f"\nWarning: {e}")
+        print("Starting again from record 0")
+        next_index = 0
+    except (LinkError, FrameError) as e:
+        print(f"\nDownload stopped: {e}")
+        print(f"Resume with --start {next_index}")
+    finally:
+        if store is not None and pending:
+            store.import_records(device_id, pending)
+        link.close()
+        link.print_stats()
+        if detector is not None:
+            detector.print_summary()
+    return next_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download records reliably")
+    parser.add_argument("port", help="COM port or tcp://host:port")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--start", type=int, default=0,
+                        help="Record index to resume from")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--store", metavar="DB",
+                        help="Import records into this SQLite record store")
+    parser.add_argument("--device", help="Device id in the store (default: port)")
+    parser.add_argument("--detect", action="store_true",
+                        help="Flag anomalous records as they arrive")
+    parser.add_argument("--every", type=float, default=0, metavar="SECONDS",
+                        help="Keep downloading new records every SECONDS over "
+                             "one pooled connection (0 = download once)")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.every and args.profile:
+        parser.error("--profile profiles a single download, it cannot be "
+                     "combined with --every")
+
+    store = RecordStore(args.store) if args.store else None
+    detector = AnomalyDetector() if args.detect else None
+    device_id = args.device or args.port
+    if not args.every:
+        link = ReliableLink(args.port, args.baud, max_retries=args.retries)
+        run_maybe_profiled(args, download, link, args.start, store,
+                           device_id, detector, name="download")
+        return
+
+    # Each round resumes where the last one stopped, so only new records
+    # are read, and the pool keeps a remote (tcp://) connection open
+    pool = TransportPool(args.baud, timeout=0.05)
+    start = args.start
+    try:
+        while True:
+            link = ReliableLink(args.port, args.baud, max_retries=args.retries,
+                                pool=pool)
+            start = download(link, start, store, device_id, detector)
+            time.sleep(args.every)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Output rendering - lazy formatting, batched console, JSONL log
+
+The probe and monitor paths used to format every chunk as hex, spaced
+hex, repr and UTF-8 and print each line straight away, so at high data
+rates the terminal set the pace. Output now goes through a Renderer:
+
+- every view of the data has a verbosity level and is only formatted
+  when that level is active
+- console lines are buffered and written by a background thread every
+  flush_interval, capped at max_lines_per_flush (the rest are counted
+  and reported as suppressed)
+- with a JSONL log, each event is queued as raw bytes and serialised on
+  a second background thread
+
+Verbosity:
+    QUIET   - nothing but errors and summaries
+    NORMAL  - one hex line per chunk (default)
+    VERBOSE - spaced hex, repr and ASCII views
+    DEBUG   - value guessing in parse_response
+"""
+
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+
+QUIET = 0
+NORMAL = 1
+VERBOSE = 2
+DEBUG = 3
+
+# Views of a byte string and the verbosity each needs
+VIEWS = {
+    'hex': (NORMAL, lambda data: data.hex()),
+    'raw': (VERBOSE, lambda data: ' '.join(f'{b:02X}' for b in data)),
+    'repr': (VERBOSE, repr),
+    'ascii': (VERBOSE, lambda data: data.decode('utf-8', errors='replace')),
+}
+
+
+class Renderer:
+    def __init__(self, verbosity=NORMAL, stream=None, flush_interval=0.1,
+                 max_lines_per_flush=500, log_path=None):
+        self.verbosity = verbosity
+        self.stream = stream or sys.stdout
+        self.flush_interval = flush_interval
+        self.max_lines_per_flush = max_lines_per_flush
+        self.lines = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.running = True
+
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+        self.log_queue = None
+        self.log_thread = None
+        if log_path:
+            self.log_queue = queue.Queue()
+            self.log_thread = threading.Thread(
+                target=self._log_loop, args=(log_path,), daemon=True)
+            self.log_thread.start()
+
+    def enabled(self, level):
+        return level <= self.verbosity
+
+    def line(self, text, level=NORMAL):
+        """
+        Queue one console line.
+
+        text may be a callable returning the string, so it is only
+        formatted when level is active.
+        """
+        if level > self.verbosity:
+            return
+        if callable(text):
+            text = text()
+        with self.lock:
+            self.lines.append(text)
+
+    def data(self, label, data, views=('hex', 'raw', 'ascii'), indent="  "):
+        """Queue one line per active view of data"""
+        for view in views:
+            level, formatter = VIEWS[view]
+            if level <= self.verbosity:
+                self.line(f"{indent}{label} {view}: {formatter(data)}", level)
+
+    def event(self, kind, **fields):
+        """Queue a structured log event; bytes values are hex-encoded later"""
+        if self.log_queue is not None:
+            self.log_queue.put((time.time(), kind, fields))
+
+    def flush(self):
+        """Write everything queued so far (call before printing directly)"""
+        # write_lock keeps the flusher thread and callers from reordering output
+        with self.write_lock:
+            with self.lock:
+                lines, self.lines = self.lines, []
+            if len(lines) > self.max_lines_per_flush:
+                suppressed = len(lines) - self.max_lines_per_flush
+                lines = lines[:self.max_lines_per_flush]
+                lines.append(f"  ... {suppressed} lines suppressed "
+                             "(use --log for the full record)")
+            if lines:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self.flusher.join()
+        self.flush()
+        if self.log_queue is not None:
+            self.log_queue.put(None)
+            self.log_thread.join()
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _log_loop(self, path):
+        with open(path, "a", encoding="utf-8") as f:
+            while True:
+                item = self.log_queue.get()
+                if item is None:
+                    return
+                timestamp, kind, fields = item
+                record = {'ts': timestamp, 'kind': kind}
+                for key, value in fields.items():
+                    record[key] = value.hex() if isinstance(value, (bytes, bytearray)) else value
+                f.write(json.dumps(record) + "\n")
+                if self.log_queue.empty():
+                    f.flush()
+
+
+_renderer = None
+
+
+def get_renderer():
+    """Shared renderer used by the probe and monitor tools"""
+    global _renderer
+    if _renderer is None:
+        _renderer = Renderer()
+    return _renderer
+
+
+def configure(verbosity=NORMAL, log_path=None, **kwargs):
+    """Replace the shared renderer (flushing and closing the old one)"""
+    global _renderer
+    if _renderer is not None:
+        _renderer.close()
+    _renderer = Renderer(verbosity, log_path=log_path, **kwargs)
+    return _renderer
+
+
+def _close_shared():
+    if _renderer is not None:
+        _renderer.close()
+
+
+atexit.register(_close_shared)
+
+
+def add_output_arguments(parser):
+    """Add the shared -v/-q/--log options to an argparse parser"""
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="More output views (-vv adds value guessing)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only print summaries")
+    parser.add_argument("--log", metavar="FILE",
+                        help="Append every event to FILE as JSON lines")
+
+
+def configure_from_args(args):
+    verbosity = QUIET if args.quiet else min(DEBUG, NORMAL + args.verbose)
+    return configure(verbosity, log_path=args.log)
@@ -3,46 +3,39 @@
 Serial Port Monitor - Listen for any data from the device
 """
 
-import serial
-import serial.tools.list_ports
+import argparse
 import time
 import sys
 
+from rendering import add_output_arguments, configure_from_args, get_renderer
+from transports import list_serial_ports, open_transport
+
 def monitor_port(port, baudrate=9600, timeout=30):
-    """Monitor serial port for incoming data"""
+    """Monitor serial port (or tcp:// URL) for incoming data"""
     print(f"Monitoring {port} at {baudrate} baud for {timeout} seconds...")
     print("Please interact with the alcohol tester device (press button, etc.)")
     print("-" * 60)
     
     try:
-        ser = serial.Serial(
-            port=port,
-            baudrate=baudrate,
-            bytesize=serial.EIGHTBITS,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            timeout=0.5
-        )
+        ser = open_transport(port, baudrate, timeout=0.5)
         
         start_time = time.time()
         buffer = bytearray()
+        out = get_renderer()
         
         while time.time() - start_time < timeout:
             if ser.in_waiting > 0:
                 data = ser.read(ser.in_waiting)
                 buffer.extend(data)
                 timestamp = time.strftime("%H:%M:%S")
-                print(f"[{timestamp}] Received {len(data)} bytes:")
-                print(f"  Hex: {data.hex()}")
-                print(f"  Raw: {' '.join(f'{b:02X}' for b in data)}")
-                try:
-                    print(f"  ASCII: {data.decode('utf-8', errors='replace')}")
-                except:
-                    pass
-                print()
+                out.event('rx', port=str(port), baudrate=baudrate, data=data)
+                out.line(f"[{timestamp}] Received {len(data)} bytes:")
+                out.data("", data, views=('hex', 'raw', 'ascii'), indent=" ")
+                out.line("")
             time.sleep(0.1)
         
         ser.close()
+        out.flush()
         
         if buffer:
             print("\n" + "=" * 60)
@@ -75,7 +68,7 @@ def try_all_baudrates(port):
     return None
 
 def main():
-    ports = serial.tools.list_ports.comports()
+    ports = list_serial_ports()
     
     usb_port = None
     for p in ports:
@@ -110,4 +103,7 @@ def main():
         monitor_port(usb_port, 9600, 60)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor the device port")
+    add_output_arguments(parser)
+    configure_from_args(parser.parse_args())
     main()
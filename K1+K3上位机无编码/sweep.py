@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Command-space sweep - every command code x format x baud rate
+
+probe_commands only tries 20 hand-picked codes with fixed sleeps. The
+sweep covers 0x00-0xFF in every build_command format at every baud rate:
+
+- the space is cut into shards (baud rate + block of codes) that worker
+  threads pull from a queue, one port per worker; with a single port the
+  shards simply run one after another on it
+- instead of a fixed wait, a reply is complete as soon as it parses as a
+  FA F5 frame or ends in CR LF, or after a short idle gap (a few
+  character times at the current baud rate); a device that never stops
+  talking is cut off after MAX_REPLY_TIME or MAX_REPLY_BYTES
+- once one format gets a reply for a code the other formats are skipped
+  (--all-formats to try them anyway), and with --early-stop the first
+  baud rate that answers cancels the shards of every other baud rate
+- a tcp:// port has no baud rate of its own (the remote serial server
+  sets it), so it can only be swept with a single --bauds value
+- finished shards are checkpointed to JSON, so an interrupted sweep
+  resumes where it stopped
+- a port error puts the shard back on the queue and reopens the port;
+  shards that keep failing, or are left when every port gave up, are
+  reported as unfinished instead of silently missing from the catalogue
+- the output is a catalogue of responses grouped by signature, with
+  each distinct response listed once with the requests that produced it
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+from alcohol_tester_reader import BAUD_RATES, AlcoholTesterReader
+from protocol import HEADER, MAX_FRAME_SIZE, ChecksumError, FrameError, parse_frame
+from rendering import add_output_arguments, configure_from_args, get_renderer
+from transports import open_transport
+
+CODES_PER_SHARD = 32
+FIRST_BYTE_TIMEOUT = 0.15
+# Idle gap that ends an unframed reply, in character times (10 bits each)
+IDLE_CHARS = 20
+MIN_IDLE_GAP = 0.005
+# Cap on one reply, for devices that stream output without pausing
+MAX_REPLY_TIME = 1.0
+MAX_REPLY_BYTES = 4 * MAX_FRAME_SIZE
+# Attempts per shard, and consecutive errors before a port's worker gives up
+SHARD_ATTEMPTS = 3
+PORT_ERROR_LIMIT = 5
+# Backoff between attempts on a port after an error (seconds)
+ERROR_BASE_DELAY = 0.2
+ERROR_MAX_DELAY = 2.0
+
+
+def read_response(transport, baudrate, first_byte_timeout=FIRST_BYTE_TIMEOUT):
+    """
+    Read one reply, returning as soon as it is recognisably complete.
+
+    Continuous output is cut off at MAX_REPLY_TIME / MAX_REPLY_BYTES and
+    what arrived so far is returned.
+    """
+    idle_gap = max(MIN_IDLE_GAP, IDLE_CHARS * 10 / baudrate)
+    deadline = time.monotonic() + first_byte_timeout
+    response = bytearray()
+    first_byte = last_byte = None
+
+    while True:
+        now = time.monotonic()
+        if not response and now >= deadline:
+            return b""
+        if response and now - last_byte >= idle_gap:
+            return bytes(response)
+        if response and (now - first_byte >= MAX_REPLY_TIME
+                         or len(response) >= MAX_REPLY_BYTES):
+            return bytes(response[:MAX_REPLY_BYTES])
+
+        chunk = transport.read(transport.in_waiting or 1)
+        if not chunk:
+            continue
+        response.extend(chunk)
+        last_byte = time.monotonic()
+        if first_byte is None:
+            first_byte = last_byte
+
+        if response.startswith(HEADER):
+            try:
+                if parse_frame(response) is not None:
+                    return bytes(response)
+            except FrameError:
+                # Complete but corrupted: still a reply worth cataloguing
+                return bytes(response)
+        elif response.endswith(b"\r\n"):
+            return bytes(response)
+
+
+def signature(response):
+    """Group key for a reply: frame command and length, or leading bytes"""
+    if response.startswith(HEADER):
+        try:
+            frame = parse_frame(response)
+        except ChecksumError:
+            return f"frame bad-checksum len {len(response)}"
+        except FrameError:
+            return f"frame bad-length len {len(response)}"
+        if frame is not None:
+            cmd_code, data, _ = frame
+            return f"frame cmd 0x{cmd_code:02X} data {len(data)}"
+    return f"raw {response[:2].hex()} len {len(response)}"
+
+
+class Sweeper:
+    def __init__(self, ports, bauds=BAUD_RATES, codes=range(256),
+                 checkpoint_path="sweep_checkpoint.json", all_formats=False,
+                 early_stop=False, first_byte_timeout=FIRST_BYTE_TIMEOUT,
+                 transport_factory=open_transport):
+        self.ports = ports
+        self.bauds = list(bauds)
+        tcp_ports = [port for port in ports if port.startswith("tcp://")]
+        if tcp_ports and len(self.bauds) > 1:
+            raise ValueError(f"{', '.join(tcp_ports)}: the baud rate of a tcp:// port is set "
+                             f"on the serial server, sweep it with a single --bauds value")
+        self.codes = list(codes)
+        self.checkpoint_path = checkpoint_path
+        self.all_formats = all_formats
+        self.early_stop = early_stop
+        self.first_byte_timeout = first_byte_timeout
+        self.transport_factory = transport_factory
+        # build_command is pure, any reader instance will do
+        self.builder = AlcoholTesterReader()
+
+        self.lock = threading.Lock()
+        self.done = set()
+        self.hits = []
+        self.live_baud = None
+        # Shard key -> (attempts so far, last error)
+        self.errors = {}
+        self.load_checkpoint()
+
+    def shards(self):
+        for baud in self.bauds:
+            for i in range(0, len(self.codes), CODES_PER_SHARD):
+                yield f"{baud}:{self.codes[i]:02X}", baud, self.codes[i:i + CODES_PER_SHARD]
+
+    def load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        self.done = set(state['done'])
+        self.hits = state['hits']
+        self.live_baud = state.get('live_baud')
+        get_renderer().line(f"Resuming: {len(self.done)} shards already done, "
+                            f"{len(self.hits)} replies")
+
+    def save_checkpoint(self):
+        """Write the checkpoint atomically (caller holds self.lock)"""
+        if not self.checkpoint_path:
+            return
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({'done': sorted(self.done), 'hits': self.hits,
+                       'live_baud': self.live_baud}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def run(self):
+        work = queue.Queue()
+        for shard in self.shards():
+            if shard[0] not in self.done:
+                work.put(shard)
+        total = work.qsize()
+        get_renderer().line(f"Sweeping {total} shards on {len(self.ports)} port(s)")
+
+        start = time.monotonic()
+        workers = [threading.Thread(target=self.worker, args=(port, work))
+                   for port in self.ports]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        out = get_renderer()
+        elapsed = time.monotonic() - start
+        unfinished = self.unfinished()
+        if unfinished:
+            out.line(f"Sweep INCOMPLETE after {elapsed:.1f}s: {len(unfinished)} "
+                     f"shards not swept, {len(self.hits)} replies so far")
+            for key, error in unfinished.items():
+                out.line(f"  {key}: {error}")
+            out.line("Run again to retry them from the checkpoint")
+        else:
+            out.line(f"Sweep finished in {elapsed:.1f}s, {len(self.hits)} replies")
+        out.flush()
+        return self.catalogue()
+
+    def unfinished(self):
+        """Shard key -> reason for every shard that should have run but did not"""
+        return {key: self.errors[key][1] if key in self.errors else "not started"
+                for key, baud, _ in self.shards()
+                if key not in self.done
+                and not (self.early_stop and self.live_baud not in (None, baud))}
+
+    def worker(self, port, work):
+        out = get_renderer()
+        transport = None
+        current_baud = None
+        port_errors = 0
+        try:
+            while True:
+                try:
+                    shard = work.get_nowait()
+                except queue.Empty:
+                    return
+                key, baud, codes = shard
+                if self.early_stop and self.live_baud not in (None, baud):
+                    continue
+
+                try:
+                    if baud != current_baud:
+                        if transport is not None:
+                            transport.close()
+                            transport = None
+                        transport = self.transport_factory(port, baud, timeout=MIN_IDLE_GAP)
+                        current_baud = baud
+                    hits = self.sweep_shard(transport, baud, codes)
+                except OSError as e:
+                    port_errors += 1
+                    with self.lock:
+                        attempts = self.errors.get(key, (0, None))[0] + 1
+                        self.errors[key] = (attempts, f"{port}: {e}")
+                    if attempts < SHARD_ATTEMPTS:
+                        work.put(shard)
+                    out.line(f"[{port}] shard {key} failed "
+                             f"(attempt {attempts}/{SHARD_ATTEMPTS}): {e}")
+                    # Reopen on the next shard, whatever its baud rate
+                    if transport is not None:
+                        try:
+                            transport.close()
+                        except OSError:
+                            pass
+                    transport = None
+                    current_baud = None
+                    if port_errors >= PORT_ERROR_LIMIT:
+                        out.line(f"[{port}] giving up after {port_errors} errors in a row")
+                        return
+                    time.sleep(min(ERROR_MAX_DELAY,
+                                   ERROR_BASE_DELAY * (2 ** (port_errors - 1))))
+                    continue
+
+                port_errors = 0
+                with self.lock:
+                    self.hits.extend(hits)
+                    self.done.add(key)
+                    self.errors.pop(key, None)
+                    if hits and self.live_baud is None:
+                        self.live_baud = baud
+                    self.save_checkpoint()
+                out.line(f"[{port}] shard {key} done, {len(hits)} replies")
+        finally:
+            if transport is not None:
+                try:
+                    transport.close()
+                except OSError:
+                    pass
+
+    def sweep_shard(self, transport, baud, codes):
+        out = get_renderer()
+        hits = []
+        for cmd_code in codes:
+            for format_name, request in self.builder.build_command(cmd_code):
+                transport.reset_input_buffer()
+                transport.write(request)
+                transport.flush()
+                response = read_response(transport, baud, self.first_byte_timeout)
+                if not response:
+                    continue
+
+                hits.append({'baud': baud, 'code': cmd_code, 'format': format_name,
+                             'request': request.hex(), 'response': response.hex()})
+                out.event('sweep_hit', baud=baud, code=cmd_code, format=format_name,
+                          request=request, response=response)
+                out.line(lambda: f"  {baud} 0x{cmd_code:02X} {format_name}: "
+                                 f"{response.hex()}")
+                if not self.all_formats:
+                    break
+        return hits
+
+    def catalogue(self):
+        """Group replies by signature, listing each distinct reply once"""
+        groups = {}
+        for hit in self.hits:
+            response = bytes.fromhex(hit['response'])
+            group = groups.setdefault(signature(response), {})
+            entry = group.setdefault(hit['response'], {'count': 0, 'requests': []})
+            entry['count'] += 1
+            entry['requests'].append(
+                f"{hit['baud']} 0x{hit['code']:02X} {hit['format']} {hit['request']}")
+
+        return {
+            'bauds': self.bauds,
+            'live_baud': self.live_baud,
+            'replies': len(self.hits),
+            'unfinished': self.unfinished(),
+            'signatures': {
+                sig: {'count': sum(e['count'] for e in responses.values()),
+                      'responses': [dict(response=r, **e) for r, e in responses.items()]}
+                for sig, responses in sorted(groups.items())
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the full command space")
+    parser.add_argument("ports", nargs="+",
+                        help="One port (or tcp:// URL) per parallel worker")
+    parser.add_argument("--bauds", type=int, nargs="+", default=BAUD_RATES)
+    parser.add_argument("--checkpoint", default="sweep_checkpoint.json")
+    parser.add_argument("--output", default="sweep_catalogue.json")
+    parser.add_argument("--all-formats", action="store_true",
+                        help="Keep trying formats after one gets a reply")
+    parser.add_argument("--early-stop", action="store_true",
+                        help="Skip other baud rates once one gets a reply")
+    parser.add_argument("--timeout", type=float, default=FIRST_BYTE_TIMEOUT,
+                        help="Seconds to wait for the first byte of a reply")
+    add_output_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    try:
+        sweeper = Sweeper(args.ports, args.bauds, checkpoint_path=args.checkpoint,
+                          all_formats=args.all_formats, early_stop=args.early_stop,
+                          first_byte_timeout=args.timeout)
+    except ValueError as e:
+        parser.error(str(e))
+    catalogue = sweeper.run()
+    with open(args.output, "w") as f:
+        json.dump(catalogue, f, indent=2)
+
+    print(f"\nCatalogue written to {args.output}:")
+    for sig, group in catalogue['signatures'].items():
+        print(f"  {sig}: {group['count']} replies, "
+              f"{len(group['responses'])} distinct")
+    if catalogue['unfinished']:
+        print(f"  PARTIAL: {len(catalogue['unfinished'])} shards were not swept")
+
+
+if __name__ == "__main__":
+    main()
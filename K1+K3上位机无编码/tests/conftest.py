@@ -0,0 +1,78 @@
+"""
+Shared fixtures: a fake K1/K3 device behind MockTransport
+
+The tools are flat scripts next to this directory, so make them importable.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import (  # noqa: E402
+    CMD_READ_RECORD,
+    CMD_RECORD_COUNT,
+    Record,
+    build_frame,
+    encode_time,
+)
+from transports import MockTransport  # noqa: E402
+
+
+def record_payload(record):
+    return (record.number.to_bytes(2, "big") + encode_time(record.timestamp)
+            + round(record.concentration * 1000).to_bytes(2, "big"))
+
+
+def make_records(count, start=datetime(2026, 1, 2, 6, 0), step=timedelta(minutes=5)):
+    return [Record(n, start + n * step, (n % 7) / 100) for n in range(count)]
+
+
+class FakeDevice:
+    """
+    Responder for MockTransport answering record count and record reads.
+
+    faults is a list of functions consulted one per request: each gets the
+    correct reply and returns the bytes to send instead (e.g. corrupted).
+    """
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self.faults = []
+        self.requests = []
+
+    def reply(self, cmd_code, data):
+        if cmd_code == CMD_RECORD_COUNT:
+            return build_frame(cmd_code, len(self.records).to_bytes(2, "big"))
+        if cmd_code == CMD_READ_RECORD:
+            index = int.from_bytes(data[:2], "big")
+            return build_frame(cmd_code, record_payload(self.records[index]))
+        return b""
+
+    def __call__(self, request):
+        cmd_code, data = request[3], request[4:-1]
+        self.requests.append(cmd_code)
+        reply = self.reply(cmd_code, data)
+        if self.faults:
+            reply = self.faults.pop(0)(reply)
+        return reply
+
+    def transport(self, timeout=0.05):
+        return MockTransport(self, timeout=timeout)
+
+
+def corrupt(reply):
+    """Flip the checksum byte"""
+    return reply[:-1] + bytes([reply[-1] ^ 0xFF])
+
+
+def silent(reply):
+    return b""
+
+
+@pytest.fixture
+def device():
+    return FakeDevice(make_records(20))
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from anomaly import AnomalyDetector
+from protocol import Record
+
+
+def kinds(flags):
+    return [flag.kind for flag in flags]
+
+
+def test_repeated_value():
+    records = [Record(n, datetime(2026, 1, 1) + timedelta(hours=n), 0.25) for n in range(6)]
+    assert kinds(AnomalyDetector().process("D", records)) == ['repeated_value']
+
+
+def test_burst_flagged_once():
+    start = datetime(2026, 1, 1, 8)
+    records = [Record(n, start + timedelta(seconds=5 * n), n / 100) for n in range(7)]
+    assert kinds(AnomalyDetector().process("D", records)) == ['burst']
+
+
+def test_clock_backwards_bounded_and_no_false_burst():
+    detector = AnomalyDetector()
+    normal = [Record(n, datetime(2026, 1, 1) + timedelta(hours=n), 0.0) for n in range(10)]
+    # RTC battery reset: the clock restarts at 2000-01-01, tests 2 hours apart
+    reset = [Record(10 + n, datetime(2000, 1, 1) + timedelta(hours=2 * n), n / 100)
+             for n in range(2000)]
+    flags = detector.process("D", normal + reset)
+    assert kinds(flags).count('clock_backwards') == 1
+    assert 'burst' not in kinds(flags)
+    assert len(detector.devices["D"].recent) <= detector.burst_count
+
+
+def test_state_carries_across_batches():
+    detector = AnomalyDetector()
+    records = [Record(n, datetime(2026, 1, 1) + timedelta(hours=n), 0.3) for n in range(6)]
+    flags = detector.process("D", records[:3]) + detector.process("D", records[3:])
+    assert kinds(flags) == ['repeated_value']
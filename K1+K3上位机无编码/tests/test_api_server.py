@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+
+from api_server import MAX_PAGE_SIZE, ApiServer
+from conftest import make_records
+from record_store import RecordStore
+
+
+async def get(port, path, etag=None):
+    """One request on a fresh connection, returns (status, headers, body)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nConnection: close\r\n"
+    if etag:
+        request += f"If-None-Match: {etag}\r\n"
+    writer.write((request + "\r\n").encode())
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+
+    head, _, body = raw.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {name.lower(): value.strip()
+               for name, _, value in (line.partition(":") for line in lines[1:])}
+    if headers.get("transfer-encoding") == "chunked":
+        data = bytearray()
+        while True:
+            size_line, _, body = body.partition(b"\r\n")
+            size = int(size_line, 16)
+            if size == 0:
+                break
+            data += body[:size]
+            body = body[size + 2:]
+        body = bytes(data)
+    return int(lines[0].split()[1]), headers, body
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = RecordStore(str(tmp_path / "records.db"))
+    store.import_records("K1-000", make_records(50))
+    store.import_records("K1-001", make_records(30))
+    yield store
+    store.close()
+
+
+def run(store, scenario):
+    async def main():
+        server = await ApiServer(store, port=0).start()
+        try:
+            return await scenario(server.port)
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_etag_gives_304_until_import(store):
+    async def scenario(port):
+        status, headers, body = await get(port, "/aggregates")
+        assert status == 200
+        etag = headers["etag"]
+        assert (await get(port, "/aggregates", etag))[0] == 304
+
+        store.import_records("K1-002", make_records(5))
+        await asyncio.sleep(0.3)     # past GENERATION_TTL
+        status, headers, body = await get(port, "/aggregates", etag)
+        assert status == 200
+        assert len(json.loads(body)["aggregates"]) == 3
+    run(store, scenario)
+
+
+@pytest.mark.parametrize("limit", ["0", "-1", "x"])
+def test_bad_limit_is_400(store, limit):
+    async def scenario(port):
+        status, _, body = await get(port, f"/records?limit={limit}")
+        assert status == 400
+        assert "error" in json.loads(body)
+    run(store, scenario)
+
+
+def test_cursor_pages_cover_everything(store):
+    async def scenario(port):
+        seen = []
+        cursor = None
+        while True:
+            path = "/records?limit=7" + (f"&cursor={cursor}" if cursor else "")
+            status, _, body = await get(port, path)
+            assert status == 200
+            page = json.loads(body)
+            seen += [(r["device_id"], r["number"]) for r in page["records"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return seen
+    seen = run(store, scenario)
+    assert len(seen) == 80
+    assert len(set(seen)) == 80
+
+
+def test_limit_is_capped(store):
+    async def scenario(port):
+        _, _, body = await get(port, f"/records?limit={MAX_PAGE_SIZE * 10}")
+        return json.loads(body)
+    assert len(run(store, scenario)["records"]) == 80
+
+
+def test_iso_since(store):
+    # make_records starts at 2026-01-02 06:00 in 5 minute steps
+    async def scenario(port):
+        _, _, t_form = await get(port, "/records?device=K1-000&since=2026-01-02T07:00")
+        _, _, space_form = await get(port, "/records?device=K1-000&since=2026-01-02%2007:00:00")
+        status, _, _ = await get(port, "/records?since=yesterday")
+        return json.loads(t_form), json.loads(space_form), status
+    t_form, space_form, status = run(store, scenario)
+    assert len(t_form["records"]) == 50 - 12
+    assert t_form == space_form
+    assert status == 400
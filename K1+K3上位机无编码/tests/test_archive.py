@@ -0,0 +1,147 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+from archive import ArchiveReader, ArchiveWriter, compact_if_needed, needs_compaction
+from conftest import make_records
+from record_store import RecordStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "records.arc")
+
+
+def read_all(path, *args):
+    with ArchiveReader(path) as reader:
+        return list(reader.read(*args))
+
+
+def test_round_trip(path):
+    records = make_records(1000)
+    with ArchiveWriter(path, chunk_records=128) as arc:
+        arc.add("K1-000", records)
+    assert [r for _, r in read_all(path)] == records
+
+
+def test_range_read_prunes_chunks(path):
+    records = make_records(1000)
+    with ArchiveWriter(path, chunk_records=100) as arc:
+        arc.add("K1-000", records)
+        arc.add("K1-001", records)
+
+    start, end = records[250].timestamp, records[260].timestamp
+    with ArchiveReader(path) as reader:
+        found = list(reader.read("K1-000", start, end))
+        assert reader.chunks_read == 1
+    assert [r for _, r in found] == records[250:260]
+
+
+def test_append_sessions(path):
+    records = make_records(300)
+    for i in range(0, 300, 50):
+        with ArchiveWriter(path) as arc:
+            arc.add("K1-000", records[i:i + 50])
+    assert [r for _, r in read_all(path)] == records
+
+
+def test_interrupted_append_keeps_previous_contents(path):
+    records = make_records(200)
+    with ArchiveWriter(path) as arc:
+        arc.add("K1-000", records[:100])
+
+    # Chunks written, then the process dies before the new index/footer
+    arc = ArchiveWriter(path, chunk_records=10)
+    arc.add("K1-000", records[100:])
+    arc.f.close()
+    assert [r for _, r in read_all(path)] == records[:100]
+
+    with ArchiveWriter(path) as arc:
+        arc.add("K1-001", records[:5])
+    assert len(read_all(path)) == 105
+
+
+def test_not_an_archive(path):
+    with open(path, "wb") as f:
+        f.write(b"x" * 100)
+    with pytest.raises(ValueError):
+        ArchiveReader(path)
+
+
+def test_timestamps_before_and_after_epoch_deltas(path):
+    # Clock reset to 2000-01-01 mid-chunk: negative deltas must survive
+    records = make_records(10) + [r._replace(number=r.number + 10,
+                                             timestamp=datetime(2000, 1, 1) + timedelta(minutes=r.number))
+                                  for r in make_records(10)]
+    with ArchiveWriter(path) as arc:
+        arc.add("K1-000", records)
+    assert sorted(r for _, r in read_all(path)) == sorted(records)
+
+
+def test_exception_during_append_rolls_back(path):
+    records = make_records(200)
+    with ArchiveWriter(path) as arc:
+        arc.add("K1-000", records[:100])
+    size = os.path.getsize(path)
+
+    with pytest.raises(KeyboardInterrupt):
+        with ArchiveWriter(path, chunk_records=10) as arc:
+            arc.add("K1-000", records[100:])
+            raise KeyboardInterrupt
+    assert os.path.getsize(path) == size
+    assert [r for _, r in read_all(path)] == records[:100]
+
+
+def test_exception_in_new_archive_leaves_no_file(path):
+    with pytest.raises(RuntimeError):
+        with ArchiveWriter(path) as arc:
+            arc.add("K1-000", make_records(10))
+            raise RuntimeError
+    assert not os.path.exists(path)
+
+
+def test_daily_appends_grow_linearly_and_compact(path):
+    records = make_records(1000)
+    sizes = []
+    for i in range(0, 1000, 40):
+        with ArchiveWriter(path, chunk_records=100) as arc:
+            arc.add("K1-000", records[i:i + 40])
+        sizes.append(os.path.getsize(path))
+    growth = [b - a for a, b in zip(sizes, sizes[1:])]
+    # Each append costs about the same, not more as the index grows
+    assert max(growth) < 2 * min(growth)
+
+    with ArchiveReader(path) as reader:
+        assert len(reader.index) == 25
+        assert needs_compaction(reader.index, 100)
+    assert compact_if_needed(path, 100)
+    with ArchiveReader(path) as reader:
+        assert [entry['count'] for entry in reader.index] == [100] * 10
+    assert [r for _, r in read_all(path)] == records
+    assert not compact_if_needed(path, 100)
+
+
+def test_interrupted_pack_is_redone_without_duplicates(path, tmp_path, monkeypatch):
+    store = RecordStore(str(tmp_path / "records.db"))
+    store.import_records("K1-000", make_records(30))
+    args = argparse.Namespace(store=store.path, archive=path)
+    archive.pack(args)
+
+    store.import_records("K1-000", make_records(20, start=datetime(2026, 2, 1)))
+    original = ArchiveWriter.add
+    def dying_add(self, device_id, records):
+        if records[0].number == 10:
+            raise KeyboardInterrupt
+        original(self, device_id, records)
+    monkeypatch.setattr(ArchiveWriter, "add", dying_add)
+    with pytest.raises(KeyboardInterrupt):
+        archive.pack(args)
+    assert len(read_all(path)) == 30
+
+    monkeypatch.setattr(ArchiveWriter, "add", original)
+    archive.pack(args)
+    archive.pack(args)
+    assert len(read_all(path)) == 50
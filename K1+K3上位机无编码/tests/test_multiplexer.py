@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+import multiplexer
+from multiplexer import PortMultiplexer
+from protocol import CMD_RECORD_COUNT, build_frame
+from reliable_link import ReliableLink
+from transports import MockTransport, TransportError
+
+
+@pytest.fixture
+def mux(device):
+    transport = device.transport()
+    mux = PortMultiplexer(transport).start()
+    yield mux
+    mux.stop()
+
+
+def test_replies_matched_by_code(mux, device):
+    pushed = []
+    mux.subscribe(lambda cmd, data: pushed.append((cmd, data)))
+    # A reading pushed by the device between request and reply
+    mux.transport.inject(build_frame(0x55, b"\x01"))
+    assert mux.request(CMD_RECORD_COUNT, timeout=1) == b"\x00\x14"
+    assert pushed == [(0x55, b"\x01")]
+
+
+def test_raw_bytes_go_to_raw_subscribers(mux):
+    raw = []
+    mux.subscribe_raw(raw.append)
+    mux.transport.inject(b"hello\r\n" + build_frame(0x55))
+    deadline = time.monotonic() + 1
+    while not raw and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert b"".join(raw) == b"hello\r\n"
+
+
+def test_zero_length_noise_does_not_stall(mux):
+    mux.transport.inject(b"\xfa\xf5\x00")
+    for _ in range(3):
+        assert mux.request(CMD_RECORD_COUNT, timeout=1) == b"\x00\x14"
+
+
+def test_reliable_link_over_mux(mux, device):
+    link = ReliableLink("unused", mux=mux, timeout=1)
+    assert [r for _, r in link.download_records(count=5)] == device.records[:5]
+
+
+def test_reconnects_after_transport_failure(device, monkeypatch):
+    class Dying(MockTransport):
+        def read(self, size=1):
+            raise TransportError("Remote end closed the connection")
+
+    transports = [Dying(), device.transport()]
+    monkeypatch.setattr(multiplexer, "open_transport", lambda *a, **k: transports.pop(0))
+    monkeypatch.setattr(multiplexer, "RECONNECT_BASE_DELAY", 0.01)
+
+    with PortMultiplexer("tcp://depot:4001") as mux:
+        link = ReliableLink("unused", mux=mux, timeout=0.5, base_delay=0.05)
+        assert link.read_record_count() == 20
+        assert mux.stats['reconnects'] == 1
+
+
+def test_failing_subscriber_does_not_kill_reader(mux):
+    def broken(*args):
+        raise RuntimeError("subscriber bug")
+
+    seen = []
+    mux.subscribe(broken)
+    mux.subscribe(lambda cmd, data: seen.append(cmd))
+    mux.subscribe_raw(broken)
+    mux.transport.inject(b"noise" + build_frame(0x55))
+    assert mux.request(CMD_RECORD_COUNT, timeout=1) == b"\x00\x14"
+    assert mux.thread.is_alive()
+    assert seen == [0x55]
+    assert mux.stats['subscriber_errors'] >= 2
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from protocol import (
+    ChecksumError,
+    FrameError,
+    build_frame,
+    decode_record,
+    decode_time,
+    encode_time,
+    parse_frame,
+)
+
+
+def test_round_trip():
+    frame = build_frame(0x06, b"\x01\x02")
+    assert frame.hex() == "faf503060102" + f"{0xFA ^ 0xF5 ^ 3 ^ 6 ^ 1 ^ 2:02x}"
+    assert parse_frame(frame) == (0x06, b"\x01\x02", len(frame))
+
+
+def test_incomplete_frame_waits_for_more():
+    frame = build_frame(0x04, b"\x00\x05")
+    for cut in range(len(frame)):
+        assert parse_frame(frame[:cut]) is None
+
+
+def test_leading_garbage_is_skipped():
+    frame = build_frame(0x04, b"\x00\x05")
+    assert parse_frame(b"\x00\x0d\x0a" + frame) == (0x04, b"\x00\x05", 3 + len(frame))
+
+
+def test_checksum_error_reports_end():
+    frame = bytearray(build_frame(0x04, b"\x00\x05"))
+    frame[-1] ^= 0xFF
+    with pytest.raises(ChecksumError) as e:
+        parse_frame(frame + build_frame(0x04))
+    assert e.value.end == len(frame)
+
+
+def test_zero_length_header_resyncs():
+    buffer = bytearray(b"\xfa\xf5\x00" + build_frame(0x04, b"\x00\x05"))
+    with pytest.raises(FrameError) as e:
+        parse_frame(buffer)
+    assert not isinstance(e.value, ChecksumError)
+    del buffer[:e.value.end]
+    assert parse_frame(buffer)[:2] == (0x04, b"\x00\x05")
+
+
+def test_time_round_trip():
+    dt = datetime(2026, 3, 4, 5, 6, 7)
+    assert decode_time(encode_time(dt)) == dt
+
+
+@pytest.mark.parametrize("data", [b"\x1a\x0d\x02\x06\x00\x00",   # month 13
+                                  b"\x1a\x02\x1e\x06\x00\x00",   # 30 February
+                                  b"\x1a\x01"])                 # too short
+def test_bad_time_is_frame_error(data):
+    with pytest.raises(FrameError):
+        decode_time(data)
+
+
+def test_decode_record():
+    record = decode_record(b"\x00\x2a" + encode_time(datetime(2026, 1, 2, 6, 0)) + b"\x01\xf4")
+    assert record.number == 42
+    assert record.timestamp == datetime(2026, 1, 2, 6, 0)
+    assert record.concentration == 0.5
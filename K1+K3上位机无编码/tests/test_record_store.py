@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_records
+from record_store import RecordStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "records.db")
+
+
+def test_reimport_is_ignored(path):
+    store = RecordStore(path)
+    records = make_records(10)
+    assert store.import_records("D", records) == 10
+    generation = store.generation()
+    assert store.import_records("D", records) == 0
+    assert store.generation() == generation
+
+
+def test_counter_reset_starts_new_series(path):
+    store = RecordStore(path)
+    old = make_records(10)
+    store.import_records("D", old)
+
+    # Memory cleared: numbering restarts at 0 a week later
+    new = make_records(4, start=datetime(2026, 1, 9, 6, 0))
+    assert store.import_records("D", new) == 4
+    assert store.import_records("D", new + old) == 0
+
+    rows = list(store.iter_records("D", limit=-1))
+    assert [(row['series'], row['number']) for row in rows] == \
+        [(0, n) for n in range(10)] + [(1, n) for n in range(4)]
+    assert store.devices()[0]['counter_resets'] == 1
+
+
+def test_resumed_range_stays_in_series(path):
+    store = RecordStore(path)
+    records = make_records(10)
+    store.import_records("D", records[5:])
+    store.import_records("D", records[:5])
+    assert {row['series'] for row in store.iter_records("D")} == {0}
+
+
+def test_cursor_across_series(path):
+    store = RecordStore(path)
+    store.import_records("D", make_records(3))
+    store.import_records("D", make_records(3, start=datetime(2026, 2, 1)))
+    first = list(store.iter_records("D", limit=4))
+    last = first[-1]
+    rest = list(store.iter_records("D", after=("D", last['series'], last['number'])))
+    assert len(first) + len(rest) == 6
+
+
+def test_migrates_stores_without_series(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        CREATE TABLE devices (device_id TEXT PRIMARY KEY, last_import REAL);
+        CREATE TABLE records (device_id TEXT NOT NULL, number INTEGER NOT NULL,
+            timestamp TEXT NOT NULL, concentration REAL NOT NULL,
+            PRIMARY KEY (device_id, number));
+        INSERT INTO meta VALUES ('generation', 3);
+    """)
+    for r in make_records(5):
+        conn.execute("INSERT INTO records VALUES ('D', ?, ?, ?)",
+                     (r.number, r.timestamp.isoformat(sep=' '), r.concentration))
+    conn.commit()
+    conn.close()
+
+    store = RecordStore(path)
+    assert store.generation() == 3
+    assert [rowid for rowid, _ in store.iter_imported()] == [1, 2, 3, 4, 5]
+    new = make_records(2, start=datetime(2026, 1, 2) + timedelta(days=30))
+    assert store.import_records("D", new) == 2
+    assert store.devices()[0]['counter_resets'] == 1
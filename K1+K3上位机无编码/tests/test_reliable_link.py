@@ -0,0 +1,102 @@
+import pytest
+
+import reliable_link
+from conftest import corrupt, silent
+from protocol import build_frame
+from reliable_link import LinkError, ReliableLink, download
+from transports import MockTransport, TransportError
+
+
+def make_link(transport, **kwargs):
+    kwargs.setdefault('timeout', 0.2)
+    kwargs.setdefault('base_delay', 0.001)
+    return ReliableLink(transport, **kwargs)
+
+
+def test_download_all(device):
+    link = make_link(device.transport())
+    assert [r for _, r in link.download_records()] == device.records
+
+
+def test_retries_checksum_error_and_timeout(device):
+    device.faults = [corrupt, silent]
+    link = make_link(device.transport())
+    assert link.read_record(1) == device.records[1]
+    assert link.stats['checksum_errors'] == 1
+    assert link.stats['timeouts'] == 1
+    assert link.stats['retries'] == 2
+
+
+def test_gives_up_after_max_retries(device):
+    device.faults = [corrupt] * 10
+    link = make_link(device.transport(), max_retries=2)
+    with pytest.raises(LinkError):
+        link.read_record(0)
+    assert link.stats['checksum_errors'] == 3
+
+
+def test_skips_zero_length_noise(device):
+    device.faults = [lambda reply: b"\xfa\xf5\x00" + reply]
+    link = make_link(device.transport())
+    assert link.read_record(3) == device.records[3]
+    assert link.stats['retries'] == 0
+
+
+def bad_month(reply):
+    """Valid checksum, impossible date"""
+    payload = bytearray(reply[4:-1])
+    payload[3] = 13
+    return build_frame(reply[3], bytes(payload))
+
+
+def test_bad_date_is_retried(device):
+    device.faults = [bad_month]
+    link = make_link(device.transport())
+    assert link.read_record(2) == device.records[2]
+    assert link.stats['retries'] == 1
+
+
+def test_bad_date_reports_resume_index(device, capsys):
+    device.faults = [lambda reply: reply] * 3 + [bad_month] * 5
+    link = make_link(device.transport(), max_retries=1)
+    assert download(link, start=0) == 2
+    assert "Resume with --start 2" in capsys.readouterr().out
+
+
+def test_reopens_after_io_error(device, monkeypatch):
+    class Broken(MockTransport):
+        def write(self, data):
+            raise TransportError("USB glitch")
+
+    opened = []
+
+    def fake_open(port, baudrate, timeout):
+        transport = Broken() if not opened else device.transport()
+        opened.append(transport)
+        return transport
+
+    monkeypatch.setattr(reliable_link, "open_transport", fake_open)
+    link = make_link("COM9")
+    assert link.read_record(4) == device.records[4]
+    assert link.stats['io_errors'] == 1
+    assert link.stats['reconnects'] == 1
+    assert len(opened) == 2
+
+
+def test_unexpected_reply_code_is_retried(device):
+    device.faults = [lambda reply: build_frame(0x99, b"")]
+    link = make_link(device.transport())
+    assert link.read_record(0) == device.records[0]
+    assert link.stats['unexpected_replies'] == 1
+
+
+def test_counter_reset_restarts_from_zero(device, capsys):
+    link = make_link(device.transport())
+    assert download(link, start=0) == 20
+
+    device.records = device.records[:3]     # memory cleared, three new tests
+    link = make_link(device.transport())
+    assert download(link, start=20) == 0
+    assert "memory was probably cleared" in capsys.readouterr().out
+    link = make_link(device.transport())
+    assert download(link, start=0) == 3
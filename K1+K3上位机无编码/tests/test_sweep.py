@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+import sweep
+from protocol import build_frame
+from sweep import MAX_REPLY_BYTES, Sweeper, read_response
+from transports import MockTransport
+
+
+class Chatty(MockTransport):
+    """A device that prints without ever pausing or ending a line"""
+
+    def __init__(self, chunk=b"0.000 ", delay=0):
+        super().__init__(timeout=0.05)
+        self.chunk = chunk
+        self.delay = delay
+
+    @property
+    def in_waiting(self):
+        return len(self.chunk)
+
+    def read(self, size=1):
+        time.sleep(self.delay)
+        return self.chunk
+
+
+def test_frame_reply_returns_at_once():
+    transport = MockTransport(lambda data: build_frame(0x03, b"\x00\x14"), timeout=0.05)
+    transport.write(b"request")
+    assert read_response(transport, 9600) == build_frame(0x03, b"\x00\x14")
+
+
+def test_endless_output_capped_by_size():
+    assert len(read_response(Chatty(), 9600)) == MAX_REPLY_BYTES
+
+
+def test_endless_output_capped_by_time(monkeypatch):
+    monkeypatch.setattr(sweep, "MAX_REPLY_TIME", 0.1)
+    start = time.monotonic()
+    response = read_response(Chatty(b".", delay=0.001), 9600)
+    assert time.monotonic() - start < 0.5
+    assert 0 < len(response) < MAX_REPLY_BYTES
+
+
+def test_tcp_port_needs_a_single_baud():
+    with pytest.raises(ValueError):
+        Sweeper(["tcp://depot:4001"], bauds=[9600, 19200], checkpoint_path=None)
+    sweeper = Sweeper(["tcp://depot:4001"], bauds=[9600], checkpoint_path=None)
+    assert {baud for _, baud, _ in sweeper.shards()} == {9600}
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Transports - one byte-stream interface for serial, TCP and mock devices
+
+The protocol code only needs the small part of the pyserial API it
+already uses (write/flush/read/in_waiting/reset_*_buffer/close/is_open,
+plus the rts/dtr lines), so every transport exposes exactly that.
+
+Ports are named by URL:
+    COM3, /dev/ttyUSB0   - local serial port (pyserial)
+    tcp://host:port      - raw TCP, e.g. a ser2net remote COM server at a depot
+    mock://              - in-process device driven by a responder function
+"""
+
+import select
+import socket
+import threading
+import time
+
+
+class TransportError(OSError):
+    """The underlying link failed (same base class as serial.SerialException)"""
+
+
+class Transport:
+    """Base class; subclasses implement is_open, in_waiting, write, read, close"""
+
+    def __init__(self, timeout=2):
+        self.timeout = timeout
+        self.rts = False
+        self.dtr = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def is_open(self):
+        raise NotImplementedError
+
+    @property
+    def in_waiting(self):
+        raise NotImplementedError
+
+    def write(self, data):
+        raise NotImplementedError
+
+    def read(self, size=1):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        while self.in_waiting:
+            self.read(self.in_waiting)
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        raise NotImplementedError
+
+
+class SerialTransport(Transport):
+    """Local COM port via pyserial"""
+
+    def __init__(self, port, baudrate=9600, timeout=2, **kwargs):
+        super().__init__(timeout)
+        # See list_serial_ports: pyserial is optional for other transports
+        import serial
+        self.serial = serial.Serial(
+            port=port,
+            baudrate=baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=timeout,
+            **kwargs
+        )
+
+    @property
+    def is_open(self):
+        return self.serial.is_open
+
+    @property
+    def in_waiting(self):
+        return self.serial.in_waiting
+
+    @property
+    def rts(self):
+        return self.serial.rts
+
+    @rts.setter
+    def rts(self, value):
+        # Set by Transport.__init__ before the port exists
+        if hasattr(self, 'serial'):
+            self.serial.rts = value
+
+    @property
+    def dtr(self):
+        return self.serial.dtr
+
+    @dtr.setter
+    def dtr(self, value):
+        if hasattr(self, 'serial'):
+            self.serial.dtr = value
+
+    def write(self, data):
+        return self.serial.write(data)
+
+    def read(self, size=1):
+        return self.serial.read(size)
+
+    def flush(self):
+        self.serial.flush()
+
+    def reset_input_buffer(self):
+        self.serial.reset_input_buffer()
+
+    def reset_output_buffer(self):
+        self.serial.reset_output_buffer()
+
+    def close(self):
+        self.serial.close()
+
+
+class TcpTransport(Transport):
+    """Raw TCP byte stream (ser2net / RFC2217-less remote COM servers)"""
+
+    def __init__(self, host, port, timeout=2, connect_timeout=5):
+        super().__init__(timeout)
+        try:
+            self.sock = socket.create_connection((host, port), connect_timeout)
+        except OSError as e:
+            raise TransportError(f"Could not connect to {host}:{port}: {e}")
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+
+    @property
+    def is_open(self):
+        return self.sock is not None
+
+    def _fill(self, wait=0):
+        """Move whatever the socket has into the buffer, waiting up to wait s"""
+        if self.sock is None:
+            raise TransportError("Transport is closed")
+        ready, _, _ = select.select([self.sock], [], [], wait)
+        while ready:
+            try:
+                chunk = self.sock.recv(4096)
+            except BlockingIOError:
+                break
+            if not chunk:
+                self.close()
+                raise TransportError("Remote end closed the connection")
+            self.buffer.extend(chunk)
+            ready, _, _ = select.select([self.sock], [], [], 0)
+
+    @property
+    def in_waiting(self):
+        self._fill()
+        return len(self.buffer)
+
+    def write(self, data):
+        if self.sock is None:
+            raise TransportError("Transport is closed")
+        # send() and track the offset: sendall() on a non-blocking socket
+        # can fail after a partial send, and resending would duplicate bytes
+        view = memoryview(data)
+        while view:
+            _, ready, _ = select.select([], [self.sock], [], self.timeout)
+            if not ready:
+                raise TransportError(
+                    f"Write timed out with {len(view)} of {len(data)} bytes unsent")
+            try:
+                sent = self.sock.send(view)
+            except BlockingIOError:
+                continue
+            view = view[sent:]
+        return len(data)
+
+    def read(self, size=1):
+        """Read up to size bytes, blocking up to timeout like pyserial"""
+        deadline = time.monotonic() + (self.timeout or 0)
+        while len(self.buffer) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._fill(remaining)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class MockTransport(Transport):
+    """
+    In-process fake device.
+
+    responder(data) is called for every write and returns the bytes the
+    device sends back (or b""). inject() queues unsolicited bytes, like a
+    reading pushed when the device button is pressed.
+    """
+
+    def __init__(self, responder=None, timeout=2):
+        super().__init__(timeout)
+        self.responder = responder
+        self.buffer = bytearray()
+        self.written = []
+        self.open = True
+        self.lock = threading.Condition()
+
+    @property
+    def is_open(self):
+        return self.open
+
+    @property
+    def in_waiting(self):
+        with self.lock:
+            return len(self.buffer)
+
+    def inject(self, data):
+        with self.lock:
+            self.buffer.extend(data)
+            self.lock.notify_all()
+
+    def write(self, data):
+        if not self.open:
+            raise TransportError("Transport is closed")
+        self.written.append(bytes(data))
+        if self.responder:
+            reply = self.responder(bytes(data))
+            if reply:
+                self.inject(reply)
+        return len(data)
+
+    def read(self, size=1):
+        with self.lock:
+            self.lock.wait_for(lambda: len(self.buffer) >= size or not self.open,
+                               self.timeout)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def reset_input_buffer(self):
+        with self.lock:
+            self.buffer.clear()
+
+    def close(self):
+        with self.lock:
+            self.open = False
+            self.lock.notify_all()
+
+
+def list_serial_ports():
+    """
+    Local COM ports (pyserial's comports()).
+
+    pyserial is only imported here and in SerialTransport, so tcp:// and
+    mock:// transports work on machines without it.
+    """
+    from serial.tools import list_ports
+    return list_ports.comports()
+
+
+def open_transport(url, baudrate=9600, timeout=2, **kwargs):
+    """Open a transport from a port name or URL (see module docstring)"""
+    if isinstance(url, Transport):
+        return url
+    if url.startswith("tcp://"):
+        host, _, port = url[len("tcp://"):].rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Expected tcp://host:port, got {url}")
+        return TcpTransport(host, int(port), timeout)
+    if url.startswith("mock://"):
+        return MockTransport(timeout=timeout)
+    return SerialTransport(url, baudrate, timeout, **kwargs)
+
+
+class TransportPool:
+    """
+    Keeps one open transport per URL so a central server can share
+    remote readers between jobs instead of reconnecting each time.
+    """
+
+    def __init__(self, baudrate=9600, timeout=2):
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.transports = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            transport = self.transports.get(url)
+            if transport is None or not transport.is_open:
+                transport = open_transport(url, self.baudrate, self.timeout)
+                self.transports[url] = transport
+            return transport
+
+    def discard(self, url):
+        """Drop a broken transport so the next get() reconnects"""
+        with self.lock:
+            transport = self.transports.pop(url, None)
+        if transport is not None:
+            try:
+                transport.close()
+            except OSError:
+                pass
+
+    def close_all(self):
+        for url in list(self.transports):
+            self.discard(url)